@@ -0,0 +1,107 @@
+import argparse
+import os
+import time
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+import pyogrio
+from shapely.geometry import box
+
+# === Penyimpanan Batas Wilayah Terindeks ===
+# Shapefile batas (mis. seluruh desa satu provinsi) dikonversi sekali ke format
+# yang punya indeks spasial sehingga aplikasi hanya membaca fitur yang beririsan
+# dengan extent raster / viewport peta:
+#   - FlatGeobuf (.fgb): packed Hilbert R-tree, filter bbox langsung di indeks
+#   - GeoParquet (.parquet): baris diurutkan menurut jarak Hilbert dan ditulis
+#     per row group dengan kolom bbox (covering), sehingga filter bbox melewati
+#     row group yang tidak beririsan dari statistik kolom
+# Keduanya disimpan dalam EPSG:4326 (CRS semua raster dan peta aplikasi).
+
+DEFAULT_SOURCE = "data/Kec_Kertasari.shp"
+DEFAULT_STORE_DIR = "data/boundary"
+STORE_CRS = "EPSG:4326"
+ROW_GROUP_SIZE = 2048  # Fitur per row group GeoParquet (granularitas filter bbox)
+FORMATS = {"fgb": ".fgb", "parquet": ".parquet"}
+
+
+def store_path(source, fmt="fgb", store_dir=DEFAULT_STORE_DIR):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(store_dir, stem + FORMATS[fmt])
+
+
+def resolve(source, store_dir=DEFAULT_STORE_DIR):
+    # Pakai store terindeks jika ada dan tidak lebih tua dari shapefile sumbernya
+    for fmt in FORMATS:
+        path = store_path(source, fmt, store_dir)
+        if os.path.isfile(path) and (not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)):
+            return path
+    return source
+
+
+def build_boundary_store(source, out_path=None, fmt="fgb"):
+    out_path = out_path or store_path(source, fmt)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    gdf = gpd.read_file(source)
+    if gdf.crs != STORE_CRS:
+        gdf = gdf.to_crs(STORE_CRS)
+    # Urutan Hilbert: fitur yang berdekatan berada di row group / node indeks yang sama
+    gdf = gdf.iloc[gdf.hilbert_distance().argsort()].reset_index(drop=True)
+
+    # Tulis ke file sementara lalu ganti atomik (sama seperti raster_store). Nama
+    # sementara tetap berakhiran format aslinya: GDAL membuat direktori jika
+    # ekstensi path tidak dikenali sebagai FlatGeobuf.
+    stem, ext = os.path.splitext(os.path.basename(out_path))
+    tmp_path = os.path.join(os.path.dirname(out_path), f".{stem}.tmp{ext}")
+    if fmt == "parquet":
+        gdf.to_parquet(tmp_path, write_covering_bbox=True, row_group_size=ROW_GROUP_SIZE)
+    else:
+        gdf.to_file(tmp_path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+    os.replace(tmp_path, out_path)
+    return len(gdf)
+
+
+def feature_count(path):
+    # Hanya header/metadata yang dibaca (tanpa geometri); melempar error jika file
+    # tidak ada atau tidak terbaca, sehingga cukup untuk validasi di setiap rerun
+    if path.endswith(FORMATS["parquet"]):
+        return pq.read_metadata(path).num_rows
+    return pyogrio.read_info(path)["features"]
+
+
+def load_boundaries(path, bbox=None):
+    # bbox = (minx, miny, maxx, maxy) dalam EPSG:4326; None membaca semua fitur
+    if path.endswith(FORMATS["parquet"]):
+        gdf = gpd.read_parquet(path, bbox=bbox)
+    elif bbox is not None:
+        # Untuk sumber non-store (mis. shapefile UTM) bbox diproyeksikan ke CRS data oleh geopandas
+        gdf = gpd.read_file(path, bbox=gpd.GeoSeries([box(*bbox)], crs=STORE_CRS))
+    else:
+        gdf = gpd.read_file(path)
+    if gdf.crs != STORE_CRS:
+        gdf = gdf.to_crs(STORE_CRS)
+    return gdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Konversi shapefile batas wilayah ke FlatGeobuf/GeoParquet terindeks")
+    parser.add_argument("sources", nargs="*", default=[DEFAULT_SOURCE])
+    parser.add_argument("--format", choices=list(FORMATS), default="fgb")
+    parser.add_argument("--out-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MINX", "MINY", "MAXX", "MAXY"), help="Uji baca dengan filter bbox setelah konversi")
+    args = parser.parse_args()
+
+    for source in args.sources:
+        out_path = store_path(source, args.format, args.out_dir)
+        n_features = build_boundary_store(source, out_path, args.format)
+        size_kb = os.path.getsize(out_path) / 1024
+        print(f"{source}: {n_features} fitur -> {out_path} ({size_kb:.0f} KB)")
+
+        if args.bbox:
+            start = time.perf_counter()
+            subset = load_boundaries(out_path, tuple(args.bbox))
+            print(f"  bbox {args.bbox}: {len(subset)} fitur dalam {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import rasterio
+from streamlit import logger as st_logger
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+
+import raster_store
+
+# === Uji Beban Sesi Bersamaan ===
+# Mensimulasikan N sesi yang berjalan bersamaan di satu proses, sama seperti satu
+# instance server Streamlit: cache_resource/cache_data dipakai bersama, setiap
+# sesi punya session_state sendiri dan setiap rerun berjalan di thread sendiri.
+# Setiap sesi dijalankan lewat AppTest dengan urutan halaman yang realistis
+# (beranda, ganti layer peta, klik peta, ganti parameter analisis) dan latensi
+# setiap rerun dicatat. Hasil: throughput, persentil latensi, CPU dan memori
+# per sesi untuk menentukan ukuran deployment.
+#
+# Memori per sesi tidak bisa diturunkan dari selisih RSS: semua sesi berbagi satu
+# proses, allocator tidak selalu mengembalikan memori ke OS dan cache bersama ikut
+# tumbuh, sehingga selisihnya bisa negatif. Setelah setiap level, satu sesi
+# tambahan dijalankan dengan tracemalloc aktif (cache sudah hangat) dan memori
+# Python/NumPy yang masih dipegang selama sesi itu hidup dilaporkan.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web-kesesuaian-lahan.py")
+NAV_LABEL = "Pilih Halaman:"
+LAYER_LABEL = "🗺️ Pilih Layer:"
+PARAM_LABEL = "Pilih Parameter untuk Analisis:"
+HOME_PAGE = "🏠 Beranda"
+MAP_PAGE = "🗺️ Peta Interaktif"
+ANALYSIS_PAGE = "📊 Analisis Data"
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def current_rss_mb():
+    # RSS saat ini dari /proc (Linux); di luar Linux pakai puncak RSS dari getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def study_area_bounds(reference=raster_store.DEFAULT_REFERENCE):
+    ref = raster_store.reference_grid(reference)
+    return rasterio.transform.array_bounds(ref["height"], ref["width"], ref["transform"])
+
+
+def find_selectbox(elements, label):
+    for widget in elements.selectbox:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Selectbox '{label}' tidak ditemukan")
+
+
+class Session:
+    # Satu pengguna simulasi: satu AppTest (= satu sesi) yang menjalankan skenario
+    def __init__(self, session_id, rng, bounds, timeout, think_time):
+        self.session_id = session_id
+        self.rng = rng
+        self.bounds = bounds
+        self.think_time = think_time
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.records = []
+
+    def _timed(self, action, step):
+        start = time.perf_counter()
+        try:
+            step()
+            failed = len(self.app.exception) > 0 or len(self.app.error) > 0
+        except Exception:
+            failed = True
+        self.records.append((action, time.perf_counter() - start, failed))
+        if self.think_time > 0:
+            time.sleep(self.rng.uniform(0, self.think_time))
+
+    def open(self):
+        self._timed("buka sesi", self.app.run)
+
+    def navigate(self, page):
+        self._timed(f"halaman {page}", lambda: find_selectbox(self.app.sidebar, NAV_LABEL).select(page).run())
+
+    def _select(self, elements, label, choice):
+        # Pilihan yang tidak diterapkan aplikasi dihitung sebagai aksi gagal
+        find_selectbox(elements(), label).select(choice).run()
+        applied = find_selectbox(elements(), label).value
+        if applied != choice:
+            raise AssertionError(f"'{label}' tetap {applied!r}, bukan {choice!r}")
+
+    def switch_layer(self):
+        widget = find_selectbox(self.app.sidebar, LAYER_LABEL)
+        choice = self.rng.choice([option for option in widget.options if option != widget.value])
+        self._timed("ganti layer", lambda: self._select(lambda: self.app.sidebar, LAYER_LABEL, choice))
+
+    def click_map(self):
+        # st_folium tidak bisa diklik dari AppTest; klik disimulasikan lewat state
+        # yang sama yang diisi map_panel ketika komponen peta mengirim last_clicked
+        west, south, east, north = self.bounds
+        clicked = {"lat": self.rng.uniform(south, north), "lng": self.rng.uniform(west, east)}
+        self.app.session_state["map_state"]["last_clicked"] = clicked
+        self._timed("klik peta", self.app.run)
+
+    def switch_parameter(self):
+        widget = find_selectbox(self.app.main, PARAM_LABEL)
+        choice = self.rng.choice([option for option in widget.options if option != widget.value])
+        self._timed("ganti parameter", lambda: self._select(lambda: self.app.main, PARAM_LABEL, choice))
+
+    def run_scenario(self, layer_switches=3, clicks=2, parameter_switches=2):
+        self.navigate(HOME_PAGE)
+        self.navigate(MAP_PAGE)
+        for _ in range(layer_switches):
+            self.switch_layer()
+        for _ in range(clicks):
+            self.click_map()
+        self.navigate(ANALYSIS_PAGE)
+        for _ in range(parameter_switches):
+            self.switch_parameter()
+
+
+def run_level(n_sessions, iterations, ramp_up, think_time, timeout, seed, bounds):
+    sessions = [
+        Session(i, random.Random(seed + i), bounds, timeout, think_time)
+        for i in range(n_sessions)
+    ]
+    peak_rss = [current_rss_mb()]
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(0.2):
+            peak_rss[0] = max(peak_rss[0], current_rss_mb())
+
+    def worker(session):
+        time.sleep(ramp_up * session.session_id / max(n_sessions, 1))
+        session.open()
+        for _ in range(iterations):
+            session.run_scenario()
+
+    rss_before = current_rss_mb()
+    cpu_before = os.times()
+    wall_start = time.perf_counter()
+
+    monitor = threading.Thread(target=sample_memory, daemon=True)
+    monitor.start()
+    threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    cpu_after = os.times()
+    stop.set()
+    monitor.join()
+
+    records = [record for session in sessions for record in session.records]
+    cpu_time = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    rss_peak = max(peak_rss[0], current_rss_mb())
+    session_mb = measure_session_memory(bounds, timeout, seed + n_sessions)
+    return summarize(records, n_sessions, wall, cpu_time, rss_before, rss_peak, session_mb)
+
+
+def measure_session_memory(bounds, timeout, seed):
+    # Memori yang dipegang satu sesi (session_state, elemen terakhir, entri cache baru)
+    # selama sesi itu masih hidup, diukur dengan tracemalloc di luar pengukuran latensi
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        session = Session(-2, random.Random(seed), bounds, timeout, 0)
+        session.open()
+        session.run_scenario()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return held / 1e6
+
+
+def summarize(records, n_sessions, wall, cpu_time, rss_before, rss_peak, session_mb):
+    by_action = defaultdict(list)
+    for action, latency, _ in records:
+        by_action[action].append(latency)
+    latencies = np.array([latency for _, latency, _ in records])
+
+    def percentiles(values):
+        values = np.asarray(values) * 1000
+        stats = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+        stats["max"] = float(values.max())
+        stats["n"] = int(values.size)
+        return stats
+
+    return {
+        "sesi": n_sessions,
+        "aksi": len(records),
+        "gagal": sum(1 for _, _, failed in records if failed),
+        "durasi_s": wall,
+        "throughput_aksi_per_s": len(records) / wall if wall > 0 else 0.0,
+        "latensi_ms": percentiles(latencies) if len(records) else {},
+        "latensi_per_aksi_ms": {action: percentiles(values) for action, values in sorted(by_action.items())},
+        "cpu_s": cpu_time,
+        "cpu_inti": cpu_time / wall if wall > 0 else 0.0,
+        "rss_awal_mb": rss_before,
+        "rss_puncak_mb": rss_peak,
+        "memori_per_sesi_mb": session_mb,
+    }
+
+
+def warm_up(bounds, timeout):
+    # Satu sesi penuh dulu agar cache bersama (raster, overlay, statistik) sudah terisi;
+    # tanpa ini level pertama mengukur waktu baca data dingin, bukan kapasitas server
+    session = Session(-1, random.Random(0), bounds, timeout, 0)
+    session.open()
+    session.run_scenario()
+    return sum(latency for _, latency, _ in session.records)
+
+
+def print_report(result):
+    latency = result["latensi_ms"]
+    print(
+        f"{result['sesi']:>5} sesi | {result['aksi']:>5} aksi ({result['gagal']} gagal) | "
+        f"{result['throughput_aksi_per_s']:6.2f} aksi/s | "
+        f"p50 {latency.get('p50', 0):7.0f} ms  p95 {latency.get('p95', 0):7.0f} ms  p99 {latency.get('p99', 0):7.0f} ms | "
+        f"CPU {result['cpu_inti']:4.2f} inti | RSS puncak {result['rss_puncak_mb']:6.0f} MB | "
+        f"{result['memori_per_sesi_mb']:5.1f} MB/sesi"
+    )
+    for action, stats in result["latensi_per_aksi_ms"].items():
+        print(f"        {action:<32} n={stats['n']:<4} p50 {stats['p50']:7.0f} ms  p95 {stats['p95']:7.0f} ms  max {stats['max']:7.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban sesi bersamaan untuk aplikasi kesesuaian lahan (AppTest)")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="Jumlah sesi bersamaan; beberapa nilai dijalankan berurutan")
+    parser.add_argument("--iterations", type=int, default=2, help="Pengulangan skenario per sesi")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="Detik untuk memulai semua sesi secara bertahap")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Jeda acak maksimum (detik) antar aksi")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Batas waktu satu rerun (detik)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-warmup", action="store_true", help="Ukur juga pemuatan cache dingin")
+    parser.add_argument("--out", help="Simpan laporan lengkap sebagai JSON")
+    args = parser.parse_args()
+
+    # Peringatan "bare mode"/"No runtime found" AppTest tidak relevan untuk laporan
+    st_logger.set_log_level("error")
+    # AppTest menjalankan skrip relatif terhadap direktori kerja (path data/...)
+    os.chdir(os.path.dirname(APP_PATH))
+    bounds = study_area_bounds()
+
+    if not args.no_warmup:
+        print(f"Pemanasan cache: {warm_up(bounds, args.timeout):.1f} s")
+
+    # AppTest.run() menyalakan global.appTest hanya selama rerun-nya lalu
+    # memulihkannya; dengan sesi paralel, rerun yang selesai mematikan opsi itu
+    # di tengah rerun sesi lain sehingga format_func widgetnya tidak terdaftar.
+    # Opsi dibiarkan menyala selama seluruh uji.
+    results = []
+    with patch_config_options({"global.appTest": True}):
+        for n_sessions in args.sessions:
+            result = run_level(n_sessions, args.iterations, args.ramp_up, args.think_time, args.timeout, args.seed, bounds)
+            print_report(result)
+            results.append(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Laporan ditulis ke {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import rasterio
+from pyproj import CRS as ProjCRS
+from rasterio.features import geometry_mask
+from rasterio.warp import reproject, transform_bounds, Resampling
+
+import boundary_store
+
+# === Format Raster Stack ===
+# File tunggal: magic (8 byte) + panjang header (uint32 LE) + header JSON,
+# lalu setiap layer ditulis tanpa kompresi pada offset kelipatan PAGE_SIZE
+# sehingga semua worker bisa membuka file yang sama dengan np.memmap dan
+# berbagi page cache OS (zero-copy, tanpa decode GeoTIFF per proses).
+#
+# Semua layer di-resample (nearest) ke grid acuan (raster kelas 360x262) agar
+# analisis multi-layer bisa bekerja per piksel. Layer yang grid aslinya berbeda
+# (mis. Tutupan Lahan 1797x1306, Kemiringan/Tekstur 600x436) ditandai
+# "native": false di header: stack tetap dipakai untuk analisis ter-align,
+# tetapi tampilan peta, klik dan statistik layer tersebut membaca GeoTIFF
+# aslinya agar resolusinya tidak turun (lihat has_native_layer).
+MAGIC = b"PPLSTK01"
+PAGE_SIZE = 4096
+NODATA = 0  # Sentinel untuk layer uint8 (kode kelas/skor selalu >= 1)
+BOUNDARY_KEY = "__batas__"
+
+DEFAULT_STORE_PATH = "data/raster_stack.bin"
+DEFAULT_REFERENCE = "data/potato_suitability_class.tif"
+DEFAULT_BOUNDARY = "data/Kec_Kertasari.shp"
+
+
+class RasterStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"'{path}' bukan file raster stack yang valid")
+            header_len = int.from_bytes(f.read(4), "little")
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.height = self.header["height"]
+        self.width = self.header["width"]
+        self.transform = rasterio.Affine(*self.header["transform"])
+        self.crs = rasterio.crs.CRS.from_wkt(self.header["crs"])
+        self.nodata = self.header["nodata"]
+        self.layers = self.header["layers"]
+        self._arrays = {}
+        self._pixel_areas = None
+
+    def has_layer(self, key):
+        if key not in self.layers:
+            return False
+        # Abaikan layer yang sumbernya lebih baru dari stack (stack basi)
+        source = self.layers[key].get("source")
+        if source and os.path.exists(source):
+            return os.path.getmtime(source) <= self.layers[key]["source_mtime"]
+        return True
+
+    def has_native_layer(self, key):
+        # Layer tersimpan pada grid aslinya (tanpa resampling) dan boleh dipakai untuk tampilan
+        return self.has_layer(key) and self.layers[key].get("native", False)
+
+    def layer(self, key):
+        # Memmap read-only; view dibuat sekali per proses dan dipakai ulang
+        if key not in self._arrays:
+            info = self.layers[key]
+            self._arrays[key] = np.memmap(
+                self.path,
+                dtype=np.dtype(info["dtype"]),
+                mode="r",
+                offset=info["offset"],
+                shape=(self.height, self.width),
+            )
+        return self._arrays[key]
+
+    def read_float(self, key, mask=None, step=1):
+        # Salinan float32 dengan NaN untuk nodata dan piksel di luar mask. Ini satu
+        # salinan baru per panggilan (bukan zero-copy); yang dibagi antar proses
+        # adalah memmap dari layer(), hasil render di atasnya di-cache pemanggil.
+        # step > 1 mengambil setiap piksel ke-step dari memmap sebelum konversi.
+        data = self.layer(key)[::step, ::step]
+        if mask is not None:
+            mask = mask[::step, ::step]
+        out = data.astype(np.float32)
+        invalid = data == self.nodata if data.dtype == np.uint8 else np.zeros(data.shape, dtype=bool)
+        if mask is not None:
+            invalid |= ~mask
+        out[invalid] = np.nan
+        return out
+
+    def boundary(self):
+        if BOUNDARY_KEY not in self.layers:
+            return None
+        return self.layer(BOUNDARY_KEY).astype(bool)
+
+    def sample(self, key, lon, lat):
+        row, col = rasterio.transform.rowcol(self.transform, lon, lat)
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise IndexError("Koordinat di luar grid raster stack")
+        value = self.layer(key)[row, col]
+        if self.layers[key]["dtype"] == "uint8" and value == self.nodata:
+            return np.nan
+        return value
+
+    def pixel_areas(self):
+        # Luas tiap piksel (m²) dari vektor luas per baris, dihitung sekali per proses
+        if self._pixel_areas is None:
+            rows = pixel_area_rows(self.transform, self.height, self.crs)
+            self._pixel_areas = np.broadcast_to(rows[:, None], (self.height, self.width))
+        return self._pixel_areas
+
+    def value_counts(self, key):
+        # Hitung frekuensi nilai tanpa menyalin data (bincount langsung di memmap)
+        data = self.layer(key)
+        if data.dtype == np.uint8:
+            counts = np.bincount(data.ravel(), minlength=256)
+            counts[self.nodata] = 0
+            values = np.nonzero(counts)[0]
+            return values.astype(np.float64), counts[values]
+        valid = data[np.isfinite(data)]
+        return np.unique(valid, return_counts=True)
+
+    def value_areas(self, key):
+        # Sama seperti value_counts, ditambah luas (m²) per nilai sebagai jumlah terbobot
+        data = self.layer(key)
+        areas = self.pixel_areas()
+        if data.dtype == np.uint8:
+            counts = np.bincount(data.ravel(), minlength=256)
+            sums = np.bincount(data.ravel(), weights=areas.ravel(), minlength=256)
+            counts[self.nodata] = 0
+            values = np.nonzero(counts)[0]
+            return values.astype(np.float64), counts[values], sums[values]
+        valid = np.isfinite(data)
+        values, inverse, counts = np.unique(data[valid], return_inverse=True, return_counts=True)
+        return values, counts, np.bincount(inverse, weights=areas[valid], minlength=len(values))
+
+
+def open_store(path=DEFAULT_STORE_PATH):
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return RasterStore(path)
+
+
+# === Luas Piksel ===
+
+def pixel_area_rows(transform, height, crs):
+    # Luas satu piksel (m²) untuk setiap baris grid. CRS geografis: luas geodesik
+    # sel lintang/bujur pada elipsoid CRS (sama untuk semua kolom dalam satu baris);
+    # CRS proyeksi: luas konstan dari ukuran piksel dalam satuan linear CRS.
+    if crs is not None and crs.is_geographic:
+        geod = ProjCRS.from_user_input(crs.to_wkt()).get_geod()
+        x0, x1 = transform.c, transform.c + transform.a
+        tops = transform.f + transform.e * np.arange(height)
+        return np.array([
+            abs(geod.polygon_area_perimeter([x0, x1, x1, x0], [top, top, top + transform.e, top + transform.e])[0])
+            for top in tops
+        ])
+    unit_factor = crs.linear_units_factor[1] if crs is not None else 1.0
+    return np.full(height, abs(transform.a * transform.e) * unit_factor ** 2)
+
+
+# === Build Step ===
+
+def reference_grid(reference=DEFAULT_REFERENCE):
+    with rasterio.open(reference) as ref_src:
+        return {
+            "height": ref_src.height,
+            "width": ref_src.width,
+            "transform": ref_src.transform,
+            "crs": ref_src.crs,
+        }
+
+
+def reference_bounds(reference=DEFAULT_REFERENCE):
+    # Extent grid acuan dalam EPSG:4326 (untuk filter bbox batas wilayah)
+    ref = reference_grid(reference)
+    bounds = rasterio.transform.array_bounds(ref["height"], ref["width"], ref["transform"])
+    return transform_bounds(ref["crs"], boundary_store.STORE_CRS, *bounds)
+
+
+def align_layer(path, ref):
+    with rasterio.open(path) as src:
+        source = src.read(1).astype(np.float32)
+        if src.nodata is not None and not np.isnan(src.nodata):
+            source[source == src.nodata] = np.nan
+
+        aligned = np.full((ref["height"], ref["width"]), np.nan, dtype=np.float32)
+        reproject(
+            source=source,
+            destination=aligned,
+            src_transform=src.transform,
+            src_crs=src.crs,
+            src_nodata=np.nan,
+            dst_transform=ref["transform"],
+            dst_crs=ref["crs"],
+            dst_nodata=np.nan,
+            resampling=Resampling.nearest,
+        )
+
+    valid = np.isfinite(aligned)
+    values = aligned[valid]
+    # Layer kelas/skor diskrit (1-255) disimpan sebagai uint8, sisanya float32
+    if values.size and np.all(values == np.round(values)) and values.min() >= 1 and values.max() <= 255:
+        coded = np.full(aligned.shape, NODATA, dtype=np.uint8)
+        coded[valid] = values.astype(np.uint8)
+        return coded
+    return aligned
+
+
+def is_native_grid(path, ref):
+    with rasterio.open(path) as src:
+        return (
+            src.height == ref["height"]
+            and src.width == ref["width"]
+            and src.crs == ref["crs"]
+            and src.transform.almost_equals(ref["transform"])
+        )
+
+
+def _boundary_layer(shp_path, ref):
+    bounds = rasterio.transform.array_bounds(ref["height"], ref["width"], ref["transform"])
+    bbox = transform_bounds(ref["crs"], boundary_store.STORE_CRS, *bounds)
+    gdf = boundary_store.load_boundaries(boundary_store.resolve(shp_path), bbox).to_crs(ref["crs"])
+    inside = ~geometry_mask(
+        list(gdf.geometry),
+        out_shape=(ref["height"], ref["width"]),
+        transform=ref["transform"],
+    )
+    return inside.astype(np.uint8)
+
+
+def build_store(raster_paths, out_path=DEFAULT_STORE_PATH, reference=DEFAULT_REFERENCE, boundary=DEFAULT_BOUNDARY):
+    ref = reference_grid(reference)
+
+    arrays = {path: align_layer(path, ref) for path in raster_paths}
+    if boundary:
+        arrays[BOUNDARY_KEY] = _boundary_layer(boundary, ref)
+
+    # Header ditulis dua kali: pertama untuk mengetahui panjangnya, lalu dengan offset final
+    layers = {}
+    for key, data in arrays.items():
+        layers[key] = {"dtype": data.dtype.name, "offset": 0}
+        if key != BOUNDARY_KEY:
+            layers[key]["source"] = key
+            layers[key]["source_mtime"] = os.path.getmtime(key)
+            layers[key]["native"] = is_native_grid(key, ref)
+
+    header = {
+        "version": 1,
+        "height": ref["height"],
+        "width": ref["width"],
+        "transform": list(ref["transform"])[:6],
+        "crs": ref["crs"].to_wkt(),
+        "nodata": NODATA,
+        "layers": layers,
+    }
+
+    def encode(hdr):
+        return json.dumps(hdr, ensure_ascii=False).encode("utf-8")
+
+    def page_align(n):
+        return -(-n // PAGE_SIZE) * PAGE_SIZE
+
+    # Offset maksimum (12 digit) dipakai agar panjang header stabil setelah diisi
+    for info in layers.values():
+        info["offset"] = 10 ** 12
+    offset = page_align(len(MAGIC) + 4 + len(encode(header)))
+    for key, data in arrays.items():
+        layers[key]["offset"] = offset
+        offset = page_align(offset + data.nbytes)
+
+    header_bytes = encode(header)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for key, data in arrays.items():
+            f.seek(layers[key]["offset"])
+            f.write(np.ascontiguousarray(data).tobytes())
+    # Ganti atomik agar worker yang sedang berjalan tidak membaca file setengah jadi
+    os.replace(tmp_path, out_path)
+    return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bangun raster stack ter-align untuk dibagi antar worker Streamlit")
+    parser.add_argument("rasters", nargs="*", help="File GeoTIFF (default: semua data/*.tif)")
+    parser.add_argument("--out", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--reference", default=DEFAULT_REFERENCE, help="Raster acuan grid (transform/CRS/ukuran)")
+    parser.add_argument("--boundary", default=DEFAULT_BOUNDARY, help="SHP batas wilayah untuk layer clipping")
+    args = parser.parse_args()
+
+    rasters = args.rasters or sorted(glob.glob("data/*.tif"))
+    header = build_store(rasters, args.out, args.reference, args.boundary)
+    size_mb = os.path.getsize(args.out) / 1e6
+    print(f"Raster stack ditulis ke {args.out} ({header['width']}x{header['height']}, {len(header['layers'])} layer, {size_mb:.1f} MB)")
+    for key, info in header["layers"].items():
+        grid = "" if key == BOUNDARY_KEY else (" (grid asli)" if info["native"] else " (di-resample, tampilan pakai GeoTIFF)")
+        print(f"  {key}: {info['dtype']} @ {info['offset']}{grid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "web-kesesuaian-lahan.py")
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Aplikasi membaca data/... relatif terhadap direktori kerja
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("PPL_PREFETCH", "0")
+    monkeypatch.syspath_prepend(ROOT)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    # Modul aplikasi (nama file memakai tanda hubung, jadi dimuat lewat importlib)
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    os.environ["PPL_PREFETCH"] = "0"
+    try:
+        spec = importlib.util.spec_from_file_location("web_kesesuaian_lahan", APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
@@ -0,0 +1,33 @@
+from streamlit.testing.v1 import AppTest
+
+from conftest import APP_PATH
+
+MAP_PAGE = "🗺️ Peta Interaktif"
+LAYER_LABEL = "🗺️ Pilih Layer:"
+
+
+def find_widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+def open_map_page():
+    at = AppTest.from_file(APP_PATH, default_timeout=180).run()
+    find_widget(at.sidebar.selectbox, "Pilih Halaman:").select(MAP_PAGE).run()
+    return at
+
+
+def test_layer_switches_are_all_applied():
+    at = open_map_page()
+    for layer in ["Suhu", "Ketinggian", "Kemiringan"]:
+        find_widget(at.sidebar.selectbox, LAYER_LABEL).select(layer).run()
+        assert not at.exception
+        assert find_widget(at.sidebar.selectbox, LAYER_LABEL).value == layer
+        assert at.session_state["map_state"]["layer"] == layer
+
+
+def test_layer_survives_page_switch():
+    at = open_map_page()
+    find_widget(at.sidebar.selectbox, LAYER_LABEL).select("Curah Hujan").run()
+    find_widget(at.sidebar.selectbox, "Pilih Halaman:").select("🏠 Beranda").run()
+    find_widget(at.sidebar.selectbox, "Pilih Halaman:").select(MAP_PAGE).run()
+    assert find_widget(at.sidebar.selectbox, LAYER_LABEL).value == "Curah Hujan"
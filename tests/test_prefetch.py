@@ -0,0 +1,30 @@
+import os
+
+
+def test_prefetch_stops_between_steps_when_cancelled(app_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module, "vector_tile_source", lambda path: None)
+    monkeypatch.setattr(app_module, "render_raster_overlay", lambda path: calls.append("overlay"))
+    monkeypatch.setattr(app_module, "raster_value_counts", lambda path: calls.append("counts"))
+
+    # Dibatalkan setelah langkah pertama: hitungan piksel tidak lagi dihitung
+    assert app_module.prefetch_layer("Suhu", cancelled=lambda: len(calls) > 0) is False
+    assert calls == ["overlay"]
+
+    calls.clear()
+    assert app_module.prefetch_layer("Suhu") is True
+    assert calls == ["overlay", "counts"]
+
+
+def test_layer_stamp_changes_when_file_is_replaced(app_module, monkeypatch, tmp_path):
+    path = tmp_path / "suhu.tif"
+    path.write_bytes(b"lama")
+    monkeypatch.setitem(app_module.layer_options, "Suhu", str(path))
+    before = app_module.layer_stamp("Suhu")
+
+    path.write_bytes(b"baru")
+    os.utime(path, ns=(before[1][0][0] + 10**9, before[1][0][0] + 10**9))
+
+    assert app_module.layer_stamp("Suhu") != before
+    monkeypatch.setitem(app_module.layer_options, "Suhu", str(tmp_path / "hilang.tif"))
+    assert app_module.layer_stamp("Suhu") is None
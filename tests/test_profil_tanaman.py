@@ -0,0 +1,25 @@
+import numpy as np
+
+import raster_store
+
+
+def test_kentang_profile_matches_shipped_classes(app_module):
+    class_path = app_module.layer_options["Kesesuaian Lahan Akhir"]
+    shipped = raster_store.align_layer(class_path, raster_store.reference_grid(class_path))
+    result = app_module.evaluate_crop_profiles()
+    kentang = result["classes"][result["crops"].index("Kentang")]
+
+    # S1 (kode 4) hanya 31 piksel dan paling mudah hilang jika piksel tanpa data tidak diskor
+    assert np.count_nonzero(kentang == 4) == np.count_nonzero(shipped == 4) > 0
+    np.testing.assert_array_equal(np.bincount(kentang.ravel(), minlength=5), np.bincount(shipped.ravel(), minlength=5))
+    np.testing.assert_array_equal(kentang, shipped)
+
+
+def test_zero_weight_layers_do_not_mask_pixels(app_module):
+    codes, _ = app_module.load_parameter_codes()
+    result = app_module.evaluate_crop_profiles()
+    kentang = result["classes"][result["crops"].index("Kentang")]
+    inside = app_module.load_boundary_mask()
+    # pH dan tekstur berbobot nol untuk kentang: piksel tanpa data pH tetap diklasifikasikan
+    no_ph = inside & (codes["pH Tanah"] == raster_store.NODATA) & (kentang > 0)
+    assert no_ph.any()
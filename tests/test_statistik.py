@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+
+def test_class_table_uses_raster_when_csv_scores_differ(app_module):
+    # CSV tekstur tanah memakai Skor 2/3, raster memakai 4/5
+    df = pd.read_csv("data/soil_texture_suitability_stats.csv")
+    raster_path = app_module.layer_options["Tekstur Tanah"]
+    values, counts, area_ha = app_module.raster_value_counts(raster_path)
+
+    table = app_module.raster_class_table(df, raster_path)
+
+    np.testing.assert_array_equal(table["Skor"], values)
+    np.testing.assert_array_equal(table["Piksel"], counts)
+    np.testing.assert_allclose(table["Luas (Ha)"], area_ha)
+    assert table["Luas (Ha)"].min() > 0
+    assert abs(table["Persentase"].sum() - 100) < 1e-9
@@ -0,0 +1,28 @@
+import urllib.error
+import urllib.request
+
+import tile_server
+
+
+def test_missing_tile_is_not_cached_long():
+    server = tile_server.start_server(path="data/tidak_ada.mbtiles", port=0)
+    assert server is not None and server.sources
+    try:
+        prefix = next(iter(server.sources))
+        url = f"http://127.0.0.1:{server.server_address[1]}/{prefix}/0/0/0"
+        with urllib.request.urlopen(url) as response:
+            assert response.status == 204
+            assert response.headers["Cache-Control"] == tile_server.MISSING_CACHE_CONTROL
+            assert "immutable" not in response.headers["Cache-Control"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_binds_locally_by_default():
+    server = tile_server.start_server(path="data/tidak_ada.mbtiles", port=0)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,200 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === Server Basemap Lokal ===
+# Menyajikan tile basemap dari file MBTiles atau direktori XYZ ({z}/{x}/{y}.png)
+# sehingga peta tetap bisa dipakai tanpa akses ke server OpenStreetMap, serta
+# vector tile kelas kesesuaian (MBTiles pbf dari vector_tiles.py) di /vt/<nama>/.
+# Tile yang sering diminta disimpan di memori (LRU dengan batas byte) dan
+# dikirim dengan header cache panjang agar browser tidak meminta ulang.
+#
+# Server tidak punya autentikasi, jadi secara default hanya mendengarkan di
+# 127.0.0.1. Browser menjangkaunya lewat reverse proxy yang sama dengan
+# Streamlit (URL publiknya diatur dengan PPL_TILE_URL di aplikasi).
+
+DEFAULT_BASEMAP = os.environ.get("PPL_BASEMAP", "data/basemap.mbtiles")
+DEFAULT_VECTOR_DIR = "data/vector"
+DEFAULT_PORT = int(os.environ.get("PPL_TILE_PORT", "8765"))
+DEFAULT_HOST = os.environ.get("PPL_TILE_HOST", "127.0.0.1")
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Tile kosong (204) hanya di-cache sebentar: setelah MBTiles dibuat ulang tile itu bisa berisi
+MISSING_CACHE_CONTROL = "public, max-age=300"
+
+TILE_PATTERN = re.compile(r"^/(tiles|vt/[\w-]+)/(\d+)/(\d+)/(\d+)(?:\.\w+)?$")
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp", "pbf": "application/x-protobuf"}
+
+
+class TileCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._tiles:
+                return
+            self._tiles[key] = tile
+            self.size += len(tile)
+            while self.size > self.max_bytes and self._tiles:
+                _, evicted = self._tiles.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class MBTilesSource:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        metadata = dict(self._connection().execute("SELECT name, value FROM metadata").fetchall())
+        self.format = metadata.get("format", "png")
+        self.attribution = metadata.get("attribution", "Basemap lokal")
+        self.min_zoom = int(metadata.get("minzoom", 0))
+        self.max_zoom = int(metadata.get("maxzoom", 18))
+
+    def _connection(self):
+        # Satu koneksi read-only per thread (sqlite tidak boleh dipakai lintas thread)
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._local.conn
+
+    def read(self, z, x, y):
+        # MBTiles memakai skema TMS: baris dihitung dari bawah
+        tms_y = (1 << z) - 1 - y
+        row = self._connection().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, tms_y),
+        ).fetchone()
+        return row[0] if row else None
+
+
+class XYZDirectorySource:
+    def __init__(self, path, tile_format="png"):
+        self.path = path
+        self.format = tile_format
+        self.attribution = "Basemap lokal"
+        zooms = [int(d) for d in os.listdir(path) if d.isdigit()]
+        self.min_zoom = min(zooms, default=0)
+        self.max_zoom = max(zooms, default=18)
+
+    def read(self, z, x, y):
+        tile_path = os.path.join(self.path, str(z), str(x), f"{y}.{self.format}")
+        if not os.path.exists(tile_path):
+            return None
+        with open(tile_path, "rb") as f:
+            return f.read()
+
+
+def open_source(path):
+    if os.path.isdir(path):
+        return XYZDirectorySource(path)
+    if os.path.exists(path):
+        return MBTilesSource(path)
+    raise FileNotFoundError(path)
+
+
+def open_sources(basemap=DEFAULT_BASEMAP, vector_dir=DEFAULT_VECTOR_DIR):
+    # "tiles" = basemap, "vt/<nama>" = setiap MBTiles di direktori vector tile
+    sources = {}
+    if basemap and os.path.exists(basemap):
+        sources["tiles"] = open_source(basemap)
+    if vector_dir and os.path.isdir(vector_dir):
+        for filename in sorted(os.listdir(vector_dir)):
+            if filename.endswith(".mbtiles"):
+                sources["vt/" + filename[:-len(".mbtiles")]] = MBTilesSource(os.path.join(vector_dir, filename))
+    return sources
+
+
+def make_handler(sources, cache):
+    class TileHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = TILE_PATTERN.match(self.path.split("?")[0])
+            if not match or match.group(1) not in sources:
+                self.send_error(404)
+                return
+
+            source = sources[match.group(1)]
+            content_type = CONTENT_TYPES.get(source.format, "application/octet-stream")
+            key = (match.group(1),) + tuple(int(v) for v in match.groups()[1:])
+            tile = cache.get(key)
+            if tile is None:
+                tile = source.read(*key[1:])
+                if tile is None:
+                    # Tile di luar cakupan: 204 agar Leaflet tidak menampilkan ikon rusak
+                    self.send_response(204)
+                    self.send_header("Cache-Control", MISSING_CACHE_CONTROL)
+                    self.send_header("Access-Control-Allow-Origin", "*")
+                    self.end_headers()
+                    return
+                cache.put(key, tile)
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(tile)))
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if source.format == "pbf":
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            self.wfile.write(tile)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TileHandler
+
+
+def start_server(path=DEFAULT_BASEMAP, port=DEFAULT_PORT, host=DEFAULT_HOST, cache_bytes=CACHE_MAX_BYTES, vector_dir=DEFAULT_VECTOR_DIR):
+    # Jalan di thread daemon; jika port sudah dipakai (worker lain sudah menyajikan
+    # tile yang sama) kembalikan None dan pakai server yang sudah ada.
+    sources = open_sources(path, vector_dir)
+    cache = TileCache(cache_bytes)
+    try:
+        server = ThreadingHTTPServer((host, port), make_handler(sources, cache))
+    except OSError:
+        return None
+    server.daemon_threads = True
+    server.sources = sources
+    server.cache = cache
+    threading.Thread(target=server.serve_forever, name="tile-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sajikan basemap MBTiles/XYZ lokal untuk peta aplikasi")
+    parser.add_argument("basemap", nargs="?", default=DEFAULT_BASEMAP, help="File .mbtiles atau direktori XYZ")
+    parser.add_argument("--vector-dir", default=DEFAULT_VECTOR_DIR, help="Direktori MBTiles vector tile")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Alamat bind (default hanya lokal; sajikan ke luar lewat reverse proxy)")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_MAX_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    sources = open_sources(args.basemap, args.vector_dir)
+    if not sources:
+        parser.error("Tidak ada basemap maupun vector tile yang bisa disajikan")
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(sources, TileCache(args.cache_mb * 1024 * 1024)))
+    for prefix, source in sources.items():
+        print(f"Menyajikan {prefix} (zoom {source.min_zoom}-{source.max_zoom}) di http://{args.host}:{args.port}/{prefix}/{{z}}/{{x}}/{{y}}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
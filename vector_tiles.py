@@ -0,0 +1,178 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import sqlite3
+
+import geopandas as gpd
+import mapbox_vector_tile
+import numpy as np
+import rasterio
+from rasterio.features import geometry_mask, shapes
+from rasterio.warp import transform_bounds
+from shapely.geometry import box, shape
+
+import boundary_store
+
+# === Piramida Vector Tile (MVT) ===
+# Raster kelas divektorisasi sekali menjadi poligon per kelas, lalu dipotong
+# menjadi tile MVT per zoom dengan toleransi simplifikasi sebesar setengah
+# piksel layar pada zoom tersebut. Hasilnya disimpan sebagai MBTiles (format
+# pbf, tile di-gzip) dan disajikan oleh tile_server.py di /vt/<nama>/{z}/{x}/{y}.
+
+DEFAULT_VECTOR_DIR = "data/vector"
+DEFAULT_BOUNDARY = "data/Kec_Kertasari.shp"
+LAYER_NAME = "kelas"
+EXTENT = 4096
+BUFFER_PX = 8  # Buffer tile (piksel layar) agar garis batas tidak terpotong di tepi tile
+
+WEB_MERCATOR_HALF = 20037508.342789244
+
+suitability_class_names = {
+    1: "N - Tidak Sesuai",
+    2: "S3 - Sesuai Marginal",
+    3: "S2 - Cukup Sesuai",
+    4: "S1 - Sangat Sesuai",
+}
+
+
+def tileset_name(raster_path):
+    return os.path.splitext(os.path.basename(raster_path))[0]
+
+
+def vectorize_classes(raster_path, boundary=DEFAULT_BOUNDARY, class_names=None):
+    with rasterio.open(raster_path) as src:
+        data = src.read(1).astype(np.float64)
+        if src.nodata is not None and not np.isnan(src.nodata):
+            data[data == src.nodata] = np.nan
+        valid = np.isfinite(data)
+        if boundary:
+            bbox = transform_bounds(src.crs, boundary_store.STORE_CRS, *src.bounds)
+            gdf_boundary = boundary_store.load_boundaries(boundary_store.resolve(boundary), bbox).to_crs(src.crs)
+            valid &= ~geometry_mask(list(gdf_boundary.geometry), out_shape=data.shape, transform=src.transform)
+        codes = np.where(valid, np.round(data), 0).astype(np.int32)
+        polygons = [
+            (shape(geom), int(value))
+            for geom, value in shapes(codes, mask=valid, transform=src.transform)
+        ]
+        crs = src.crs
+
+    gdf = gpd.GeoDataFrame(
+        {"kode": [value for _, value in polygons]},
+        geometry=[geom for geom, _ in polygons],
+        crs=crs,
+    )
+    class_names = class_names or {}
+    gdf["kelas"] = [class_names.get(code, f"Skor {code}") for code in gdf["kode"]]
+    # Luas dihitung di proyeksi UTM lokal agar akurat (bukan di Web Mercator)
+    gdf["luas_ha"] = (gdf.to_crs(gdf.estimate_utm_crs()).area / 10000).round(2)
+    return gdf.to_crs("EPSG:3857")
+
+
+def tile_bounds(z, x, y):
+    size = 2 * WEB_MERCATOR_HALF / (1 << z)
+    minx = -WEB_MERCATOR_HALF + x * size
+    maxy = WEB_MERCATOR_HALF - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, z):
+    minx, miny, maxx, maxy = bounds
+    size = 2 * WEB_MERCATOR_HALF / (1 << z)
+    x0 = int(math.floor((minx + WEB_MERCATOR_HALF) / size))
+    x1 = int(math.floor((maxx + WEB_MERCATOR_HALF) / size))
+    y0 = int(math.floor((WEB_MERCATOR_HALF - maxy) / size))
+    y1 = int(math.floor((WEB_MERCATOR_HALF - miny) / size))
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def build_pyramid(gdf, out_path, min_zoom=10, max_zoom=16, name=None):
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+
+    n_tiles = 0
+    for z in range(min_zoom, max_zoom + 1):
+        # Simplifikasi per zoom: setengah piksel layar (256 px per tile)
+        pixel = 2 * WEB_MERCATOR_HALF / (1 << z) / 256
+        simplified = gdf.copy()
+        # make_valid: poligon hasil raster bisa punya lubang yang bersinggungan dengan shell
+        simplified["geometry"] = gdf.geometry.simplify(pixel / 2, preserve_topology=True).make_valid()
+        simplified = simplified[~simplified.geometry.is_empty]
+        index = simplified.sindex
+
+        xs, ys = tile_range(simplified.total_bounds, z)
+        for x in xs:
+            for y in ys:
+                bounds = tile_bounds(z, x, y)
+                clip_box = box(*bounds).buffer(BUFFER_PX * pixel, join_style=2)
+                hits = index.query(clip_box, predicate="intersects")
+                if len(hits) == 0:
+                    continue
+
+                features = []
+                for row in simplified.iloc[hits].itertuples():
+                    geom = row.geometry.intersection(clip_box)
+                    if geom.is_empty:
+                        continue
+                    features.append({
+                        "geometry": geom,
+                        "properties": {"kode": row.kode, "kelas": row.kelas, "luas_ha": row.luas_ha},
+                    })
+                if not features:
+                    continue
+
+                tile = mapbox_vector_tile.encode(
+                    [{"name": LAYER_NAME, "features": features}],
+                    default_options={"quantize_bounds": bounds, "extents": EXTENT},
+                )
+                conn.execute(
+                    "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                    (z, x, (1 << z) - 1 - y, gzip.compress(tile)),
+                )
+                n_tiles += 1
+
+    lon_lat = gdf.to_crs("EPSG:4326").total_bounds
+    metadata = {
+        "name": name or os.path.splitext(os.path.basename(out_path))[0],
+        "format": "pbf",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": ",".join(f"{v:.6f}" for v in lon_lat),
+        "attribution": "Kesesuaian Lahan Kertasari",
+        "json": json.dumps({"vector_layers": [{"id": LAYER_NAME, "fields": {"kode": "Number", "kelas": "String", "luas_ha": "Number"}}]}),
+    }
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, out_path)
+    return n_tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bangun piramida vector tile (MBTiles) dari raster kelas")
+    parser.add_argument("rasters", nargs="*", default=["data/potato_suitability_class.tif"])
+    parser.add_argument("--out-dir", default=DEFAULT_VECTOR_DIR)
+    parser.add_argument("--boundary", default=DEFAULT_BOUNDARY)
+    parser.add_argument("--min-zoom", type=int, default=10)
+    parser.add_argument("--max-zoom", type=int, default=16)
+    args = parser.parse_args()
+
+    for raster_path in args.rasters:
+        class_names = suitability_class_names if "class" in os.path.basename(raster_path) else None
+        gdf = vectorize_classes(raster_path, args.boundary, class_names)
+        out_path = os.path.join(args.out_dir, tileset_name(raster_path) + ".mbtiles")
+        n_tiles = build_pyramid(gdf, out_path, args.min_zoom, args.max_zoom)
+        size_kb = os.path.getsize(out_path) / 1024
+        print(f"{raster_path}: {len(gdf)} poligon -> {n_tiles} tile ({size_kb:.0f} KB) di {out_path}")
+
+
+if __name__ == "__main__":
+    main()
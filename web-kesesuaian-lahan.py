@@ -1,20 +1,34 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import geopandas as gpd
 import rasterio
 import numpy as np
 import folium
 from streamlit_folium import st_folium
-from folium.plugins import Fullscreen
+from folium.plugins import Fullscreen, VectorGridProtobuf
+from branca.element import MacroElement
+from jinja2 import Template
 from folium.raster_layers import ImageOverlay
 from PIL import Image
 import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap, BoundaryNorm
+from matplotlib.colors import ListedColormap, BoundaryNorm, to_hex
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import base64
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
 from io import BytesIO
 from rasterio.mask import mask
+from rasterio.features import geometry_mask, shapes
+from rasterio.enums import Resampling
+from scipy import ndimage
+import boundary_store
+import raster_store
+import tile_server
 
 # === Konfigurasi halaman ===
 st.set_page_config(
@@ -93,22 +107,149 @@ st.markdown("""
 # === Definisi Layer dan Colormap ===
 layer_options = {
     "Kesesuaian Lahan Akhir": "data/potato_suitability_class.tif",
+    "Skor Kesesuaian (Kontinu)": "data/potato_suitability_score.tif",
     "Suhu": "data/temperature_suitability_score.tif",
     "Ketinggian": "data/elevation_suitability_score.tif",
     "Kemiringan": "data/slope_suitability_score.tif",
     "pH Tanah": "data/pH_suitability_score.tif",
     "Curah Hujan": "data/rainfall_suitability_score.tif",
     "Tekstur Tanah": "data/soil_texture_suitability_score.tif",
-    "Tutupan Lahan": "data/landcover_suitability_score.tif"
+    "Tutupan Lahan": "data/landcover_suitability_score.tif",
+    "Faktor Pembatas": "derived:limiting_factor"
+}
+
+# Layers computed in-app from the parameter stack instead of read from a GeoTIFF
+DERIVED_PREFIX = "derived:"
+
+SHP_PATH = "data/Kec_Kertasari.shp"
+
+# Background prefetch of likely-next map layers (PPL_PREFETCH=0 disables it)
+PREFETCH_ENABLED = os.environ.get("PPL_PREFETCH", "1") != "0"
+PREFETCH_DEPTH = 2  # Layers warmed after each switch
+PREFETCH_IDLE_S = 0.5  # Quiet period after the last foreground rerun before prefetching
+PREFETCH_CPU_SHARE = 0.25  # Maximum duty cycle of the prefetch thread
+PREFETCH_MAX_RSS_MB = float(os.environ.get("PPL_PREFETCH_MAX_RSS_MB", "1024"))
+
+# Continuous score layer: classed interactively from a fixed-bin histogram
+SCORE_LAYER = "Skor Kesesuaian (Kontinu)"
+SCORE_BINS = 256
+classification_methods = ["Interval Sama", "Kuantil", "Natural Breaks (Jenks)"]
+
+# Progressive map: longest side (pixels) of the preview overlay sent before the full resolution one,
+# only for layers whose display grid has at least PREVIEW_MIN_PIXELS (smaller ones render fast enough)
+PREVIEW_MAX_SIZE = 96
+PREVIEW_MIN_PIXELS = 1_000_000
+
+# Site selection: extra selection rounds when the minimum patch size drops area
+SITE_MAX_ROUNDS = 20
+site_color = "#6a1b9a"
+
+# Earlier/later data releases live in data/releases/<versi>/ with the same file names as data/
+RELEASES_DIR = "data/releases"
+CURRENT_RELEASE = "Saat ini (data/)"
+
+# Basemap options; the local one is served from a packaged MBTiles/XYZ set (see tile_server.py)
+ONLINE_BASEMAP = "OpenStreetMap (online)"
+LOCAL_BASEMAP = "Basemap Lokal (offline)"
+
+# Colors for class codes 1-4 (N, S3, S2, S1 / Kurang Baik .. Sangat Baik)
+class_colors = ['#d7191c', '#fdae61', '#a6d96a', '#1a9641']
+
+# Colors for the release transition map (turun kelas, tetap, naik kelas)
+transition_colors = ['#c62828', '#bdbdbd', '#2e7d32']
+
+# === Profil Tanaman ===
+parameter_layers = {
+    name: path for name, path in layer_options.items()
+    if name not in ("Kesesuaian Lahan Akhir", SCORE_LAYER) and not path.startswith(DERIVED_PREFIX)
+}
+
+MAX_SCORE = 5
+
+# Order in which the source model accumulated the weighted parameter scores
+# (float32 weight * float32 score, summed in float32). Float addition is not
+# associative, so pixels whose score sits on a class break (e.g. Kentang at 2.4)
+# only fall in the same class as the shipped rasters when summed in this order.
+SCORE_SUM_ORDER = ["Curah Hujan", "Tutupan Lahan", "Suhu", "Ketinggian", "Kemiringan", "pH Tanah", "Tekstur Tanah"]
+
+# Scores the source model gave study-area pixels that have no data in a parameter
+# raster on the aligned grid (outside the coarse temperature grid, gaps in the
+# elevation/slope grids). The crop engine uses the same values so the Kentang
+# profile reproduces the shipped rasters instead of leaving those pixels unscored.
+SOURCE_NODATA_SCORES = {"Suhu": 1, "Ketinggian": 5, "Kemiringan": 5}
+
+# One color per parameter for the limiting-factor layer (same order as parameter_layers),
+# then the two extra codes: several parameters tied, and no parameter short of its best
+parameter_colors = ['#e53935', '#8e24aa', '#6d4c41', '#fdd835', '#1e88e5', '#fb8c00', '#43a047', '#757575', '#e0e0e0']
+TIED_FACTOR = len(parameter_layers) + 1
+NO_FACTOR = len(parameter_layers) + 2
+
+# Each profile rescores the parameter score rasters (whose classes follow the potato
+# criteria on the Metodologi page), weights them and classes the sum into N/S3/S2/S1.
+# Profiles other than Kentang are initial values to be calibrated with agronomists.
+crop_profiles = {
+    "Kentang": {
+        "color": "#8d6e63",
+        # Weights reproduce potato_suitability_score.tif, where pH and soil texture carry no weight
+        "weights": {"Suhu": 0.20, "Ketinggian": 0.20, "Kemiringan": 0.15, "pH Tanah": 0.0,
+                    "Curah Hujan": 0.15, "Tekstur Tanah": 0.0, "Tutupan Lahan": 0.10},
+        "rescore": {},
+        "class_breaks": [2.4, 2.9, 3.5],
+        # Scores below the N range (1.8 - 2.4, see Metodologi) are left unclassified
+        "min_score": 1.8
+    },
+    "Kubis": {
+        "color": "#7cb342",
+        "weights": {"Suhu": 0.20, "Ketinggian": 0.15, "Kemiringan": 0.15, "pH Tanah": 0.15,
+                    "Curah Hujan": 0.15, "Tekstur Tanah": 0.10, "Tutupan Lahan": 0.10},
+        "rescore": {
+            "pH Tanah": {2: 2, 3: 4},
+            "Curah Hujan": {3: 4, 4: 3, 5: 3}
+        },
+        "class_breaks": [3.0, 3.6, 4.4]
+    },
+    "Wortel": {
+        "color": "#fb8c00",
+        "weights": {"Suhu": 0.20, "Ketinggian": 0.15, "Kemiringan": 0.15, "pH Tanah": 0.10,
+                    "Curah Hujan": 0.10, "Tekstur Tanah": 0.20, "Tutupan Lahan": 0.10},
+        "rescore": {
+            "pH Tanah": {2: 2, 3: 4},
+            "Curah Hujan": {3: 4, 4: 4, 5: 3}
+        },
+        "class_breaks": [3.0, 3.6, 4.4]
+    },
+    "Teh": {
+        "color": "#1b5e20",
+        "weights": {"Suhu": 0.15, "Ketinggian": 0.20, "Kemiringan": 0.10, "pH Tanah": 0.15,
+                    "Curah Hujan": 0.20, "Tekstur Tanah": 0.05, "Tutupan Lahan": 0.15},
+        "rescore": {
+            "Suhu": {3: 3, 4: 5, 5: 4},
+            "pH Tanah": {2: 5, 3: 3},
+            "Curah Hujan": {3: 4, 4: 5, 5: 5},
+            "Kemiringan": {1: 3, 2: 4, 3: 5, 4: 5, 5: 5}
+        },
+        "class_breaks": [3.0, 3.6, 4.4]
+    }
+}
+
+suitability_class_names = {
+    1: "N - Tidak Sesuai",
+    2: "S3 - Sesuai Marginal",
+    3: "S2 - Cukup Sesuai",
+    4: "S1 - Sangat Sesuai"
 }
 
 # === Navigation ===
 def main():
+    prefetcher = start_layer_prefetcher()
+    if prefetcher is not None:
+        prefetcher.touch()
+    
     st.sidebar.markdown('<div class="sidebar-header"><h2>🥔 Menu Navigasi</h2></div>', unsafe_allow_html=True)
     
     menu = st.sidebar.selectbox(
         "Pilih Halaman:",
-        ["🏠 Beranda", "🗺️ Peta Interaktif", "📊 Analisis Data", "📋 Metodologi", "ℹ️ Tentang"]
+        ["🏠 Beranda", "🗺️ Peta Interaktif", "📊 Analisis Data", "🌾 Multi-Tanaman", "🧩 Blok Lahan", "🎯 Pemilihan Lokasi", "🔄 Perubahan Kelas", "📋 Metodologi", "ℹ️ Tentang"]
     )
     
     if menu == "🏠 Beranda":
@@ -117,6 +258,14 @@ def main():
         interactive_map()
     elif menu == "📊 Analisis Data":
         data_analysis()
+    elif menu == "🌾 Multi-Tanaman":
+        crop_comparison()
+    elif menu == "🧩 Blok Lahan":
+        patch_analysis()
+    elif menu == "🎯 Pemilihan Lokasi":
+        site_selection()
+    elif menu == "🔄 Perubahan Kelas":
+        change_detection()
     elif menu == "📋 Metodologi":
         methodology()
     elif menu == "ℹ️ Tentang":
@@ -209,6 +358,8 @@ def homepage():
             st.error("Data CSV mengandung nilai NaN di kolom Kelas atau Persentase.")
             return
         
+        df_distribution = raster_class_table(df_distribution, layer_options["Kesesuaian Lahan Akhir"])
+        
         st.markdown("### 📊 Visualisasi Distribusi")
         fig = px.pie(
             df_distribution,
@@ -226,7 +377,6 @@ def homepage():
         st.plotly_chart(fig, use_container_width=True)
         
         st.markdown("### 📋 Tabel Detail Distribusi")
-        df_distribution['Luas (Ha)'] = df_distribution['Area_km2'] * 100
         st.dataframe(df_distribution[['Kelas', 'Piksel', 'Persentase', 'Luas (Ha)']], use_container_width=True, hide_index=True)
         
     except FileNotFoundError:
@@ -243,10 +393,43 @@ def interactive_map():
     
     st.sidebar.markdown("### 🎛️ Kontrol Peta")
     
-    selected_layer = st.sidebar.selectbox("🗺️ Pilih Layer:", list(layer_options.keys()))
+    map_state = get_map_state()
+    map_state["reruns"]["Halaman penuh"] += 1
+    
+    # Sidebar widgets have fixed keys so their identity never changes between
+    # reruns; map_state only seeds them when the page is shown again
+    restore_widget_state("peta_layer", map_state["layer"])
+    selected_layer = st.sidebar.selectbox("🗺️ Pilih Layer:", list(layer_options.keys()), key="peta_layer")
+    prefetcher = start_layer_prefetcher()
+    if prefetcher is not None:
+        prefetcher.record_switch(map_state["layer"], selected_layer)
+    map_state["layer"] = selected_layer
     raster_path = layer_options[selected_layer]
     opacity = st.sidebar.slider("🔍 Transparansi Layer", 0.1, 1.0, 0.7, 0.1)
     
+    score_classing = None
+    overlay_data = None
+    if selected_layer == SCORE_LAYER:
+        method = st.sidebar.radio("📐 Metode Klasifikasi:", classification_methods)
+        n_classes = st.sidebar.slider("🔢 Jumlah Kelas", 3, 7, 4)
+        score_classing = (method, n_classes)
+        overlay_data = render_score_overlay(raster_path, method, n_classes)
+    
+    vector_source = vector_tile_source(raster_path) if score_classing is None else None
+    if vector_source is not None:
+        restore_widget_state("peta_vektor", map_state["vector"])
+        map_state["vector"] = st.sidebar.checkbox(
+            "✏️ Batas kelas vektor (MVT)",
+            key="peta_vektor",
+            help="Poligon kelas dari vector tile: batas tetap tajam saat diperbesar dan menampilkan kelas serta luas saat kursor diarahkan"
+        )
+        if not map_state["vector"]:
+            vector_source = None
+    
+    basemap_names = [ONLINE_BASEMAP, LOCAL_BASEMAP] if start_local_basemap() is not None else [ONLINE_BASEMAP]
+    restore_widget_state("peta_basemap", map_state["basemap"] if map_state["basemap"] in basemap_names else basemap_names[0])
+    map_state["basemap"] = st.sidebar.radio("🧭 Basemap:", basemap_names, key="peta_basemap")
+    
     st.sidebar.markdown(f"""
     ### 📋 Informasi Layer
     **Layer Aktif:** {selected_layer}
@@ -255,30 +438,131 @@ def interactive_map():
     {get_layer_description(selected_layer)}
     """)
     
-    display_legend(selected_layer)
+    display_legend(selected_layer, score_classing)
     
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        st.write(f"Debug: Memuat raster dari {raster_path}")
-        map_obj = create_interactive_map(raster_path, selected_layer, opacity)
-        st_data = st_folium(map_obj, width=True, height=600)
+        map_panel(raster_path, selected_layer, opacity, vector_source, overlay_data)
+    
+    with col2:
+        statistics_panel(raster_path, selected_layer, score_classing)
+    
+    # Queued after this rerun has rendered; runs once the app has been idle for a moment
+    if prefetcher is not None:
+        prefetcher.schedule(selected_layer)
+
+def restore_widget_state(key, value):
+    # Streamlit drops a keyed widget's state when its page is not shown; seed it again
+    if key not in st.session_state:
+        st.session_state[key] = value
+
+def get_map_state():
+    # Layer, basemap, map view and last click survive reruns and page switches within a session
+    if "map_state" not in st.session_state:
+        st.session_state.map_state = {
+            "layer": list(layer_options.keys())[0],
+            "basemap": LOCAL_BASEMAP if start_local_basemap() is not None else ONLINE_BASEMAP,
+            "vector": True,
+            "center": None,
+            "zoom": None,
+            "last_clicked": None,
+            "shown_layers": set(),
+            "reruns": {"Halaman penuh": 0, "Fragmen peta": 0, "Fragmen statistik": 0, "Klik diproses": 0}
+        }
+    return st.session_state.map_state
+
+@st.fragment
+def map_panel(raster_path, selected_layer, opacity, vector_source=None, overlay_data=None):
+    map_state = get_map_state()
+    map_state["reruns"]["Fragmen peta"] += 1
+    prefetcher = start_layer_prefetcher()
+    if prefetcher is not None:
+        prefetcher.touch()
+    
+    st.write(f"Debug: Memuat raster dari {raster_path}")
+    map_slot = st.empty()
+    
+    # The first time a session shows a large layer whose full overlay has not been
+    # rendered in this process yet, a small preview map (basemap + decimated
+    # overlay only) is sent straight away and replaced by the full-resolution map
+    # once it is built. Later reruns of the same layer (pan, zoom, clicks) skip the
+    # preview so the interactive map is not torn down.
+    if (
+        overlay_data is None and vector_source is None
+        and raster_path not in map_state["shown_layers"] and needs_preview(raster_path)
+    ):
+        preview = render_raster_preview(raster_path)
+        if preview is not None:
+            preview_map = create_preview_map(preview, selected_layer, opacity, basemap=map_state["basemap"])
+            with map_slot:
+                components.html(preview_map.get_root().render(), height=600)
+    map_state["shown_layers"].add(raster_path)
+    
+    map_obj = create_interactive_map(
+        raster_path, selected_layer, opacity,
+        overlay_data=overlay_data, basemap=map_state["basemap"], vector_source=vector_source
+    )
+    # The map is built with a fixed location/zoom so its JS (and st_folium's
+    # component key, a hash of that JS) does not depend on the view. The view is
+    # kept in map_state and handed back through st_folium's dynamic center/zoom,
+    # which move the mounted map instead of rebuilding it; pan/zoom only reruns
+    # this fragment, and after a layer switch the new map opens at the same view.
+    with map_slot.container():
+        st_data = st_folium(
+            map_obj,
+            width=True,
+            height=600,
+            key="peta_interaktif",
+            returned_objects=["last_clicked", "center", "zoom"],
+            center=map_state["center"],
+            zoom=map_state["zoom"]
+        )
+    
+    if st_data:
+        if st_data.get("center"):
+            map_state["center"] = [st_data["center"]["lat"], st_data["center"]["lng"]]
+        if st_data.get("zoom"):
+            map_state["zoom"] = st_data["zoom"]
+        if st_data.get("last_clicked") and st_data["last_clicked"] != map_state["last_clicked"]:
+            map_state["last_clicked"] = st_data["last_clicked"]
+            map_state["reruns"]["Klik diproses"] += 1
+    
+    if map_state["last_clicked"]:
+        lon, lat = map_state["last_clicked"]["lng"], map_state["last_clicked"]["lat"]
+        st.success(f"📍 **Koordinat yang diklik:** {lat:.5f}°, {lon:.5f}°")
         
-        if st_data and st_data["last_clicked"]:
-            lon, lat = st_data["last_clicked"]["lng"], st_data["last_clicked"]["lat"]
-            st.success(f"📍 **Koordinat yang diklik:** {lat:.5f}°, {lon:.5f}°")
+        try:
+            value = sample_raster_value(raster_path, lon, lat)
+            interpretation = interpret_raster_value(selected_layer, value)
+            st.info(f"**Nilai:** {format_raster_value(selected_layer, value)} - {interpretation}")
             
-            try:
-                with rasterio.open(raster_path) as src:
-                    row, col = src.index(lon, lat)
-                    value = src.read(1)[row, col]
-                    interpretation = interpret_raster_value(selected_layer, value)
-                    st.info(f"**Nilai:** {value} - {interpretation}")
-            except:
-                st.warning("⚠️ Lokasi di luar area studi")
+            if selected_layer != "Faktor Pembatas":
+                factor = sample_raster_value(layer_options["Faktor Pembatas"], lon, lat)
+                if not pd.isna(factor):
+                    st.info(f"**Faktor Pembatas:** {interpret_raster_value('Faktor Pembatas', factor)}")
+        except:
+            st.warning("⚠️ Lokasi di luar area studi")
     
-    with col2:
-        show_layer_statistics(raster_path, selected_layer)
+    with st.expander("⏱️ Statistik Rerun Sesi"):
+        st.dataframe(
+            pd.DataFrame(list(map_state["reruns"].items()), columns=["Jenis", "Jumlah"]),
+            use_container_width=True,
+            hide_index=True
+        )
+        if prefetcher is not None:
+            st.caption(
+                "Prefetch layer (proses ini): "
+                + ", ".join(f"{name} {count}" for name, count in prefetcher.stats.items())
+            )
+
+@st.fragment
+def statistics_panel(raster_path, layer_name, score_classing=None):
+    get_map_state()["reruns"]["Fragmen statistik"] += 1
+    if score_classing is not None:
+        show_score_statistics(raster_path, *score_classing)
+    else:
+        show_layer_statistics(raster_path, layer_name)
 
 def data_analysis():
     st.markdown("""
@@ -297,7 +581,7 @@ def data_analysis():
             st.error("File CSV 'data/potato_suitability_stats.csv' tidak memiliki kolom yang diperlukan: Kelas, Piksel, Persentase, Area_km2")
             return
         
-        df_distribution['Luas (Ha)'] = df_distribution['Area_km2'] * 100
+        df_distribution = raster_class_table(df_distribution, layer_options["Kesesuaian Lahan Akhir"])
         
         col1, col2 = st.columns(2)
         
@@ -360,6 +644,320 @@ def data_analysis():
     except Exception as e:
         st.error(f"Error analyzing parameter: {str(e)}")
 
+def crop_comparison():
+    st.markdown("""
+    <div class="main-header">
+        <h2>🌾 Perbandingan Kesesuaian Multi-Tanaman</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    try:
+        result = evaluate_crop_profiles()
+    except Exception as e:
+        st.error(f"Error evaluating crop profiles: {str(e)}")
+        return
+    
+    with st.expander("⚖️ Profil Bobot Parameter per Tanaman"):
+        df_weights = pd.DataFrame({crop: profile["weights"] for crop, profile in crop_profiles.items()})
+        st.dataframe(df_weights, use_container_width=True)
+        df_breaks = pd.DataFrame(
+            {crop: profile["class_breaks"] for crop, profile in crop_profiles.items()},
+            index=["Batas S3", "Batas S2", "Batas S1"]
+        )
+        st.dataframe(df_breaks, use_container_width=True)
+        st.caption("Profil selain Kentang merupakan nilai awal dan perlu dikalibrasi bersama agronom.")
+    
+    st.markdown("### 📊 Distribusi Kelas Kesesuaian per Tanaman")
+    df_all = pd.concat(
+        [crop_class_statistics(crop).assign(Tanaman=crop) for crop in result["crops"]],
+        ignore_index=True
+    )
+    fig_bar = px.bar(
+        df_all,
+        x='Tanaman',
+        y='Persentase',
+        color='Kelas',
+        title='Persentase Kelas Kesesuaian per Tanaman',
+        color_discrete_map={suitability_class_names[code]: class_colors[code - 1] for code in range(1, 5)}
+    )
+    st.plotly_chart(fig_bar, use_container_width=True)
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col2:
+        map_choice = st.selectbox("🗺️ Tampilkan di Peta:", ["Tanaman Terbaik"] + result["crops"])
+        
+        if map_choice == "Tanaman Terbaik":
+            st.markdown("### 🎨 Legenda")
+            for crop in result["crops"]:
+                st.markdown(f"""
+                <div style="margin:5px 0;">
+                    <span style="background-color:{crop_profiles[crop]["color"]}; width:15px; height:15px; display:inline-block; margin-right:5px;"></span>
+                    {crop}
+                </div>
+                """, unsafe_allow_html=True)
+            st.dataframe(best_crop_statistics(), use_container_width=True, hide_index=True)
+        else:
+            st.dataframe(crop_class_statistics(map_choice)[['Kelas', 'Piksel', 'Persentase', 'Luas (Ha)']], use_container_width=True, hide_index=True)
+    
+    with col1:
+        overlay_crop = None if map_choice == "Tanaman Terbaik" else map_choice
+        map_obj = create_interactive_map(
+            None, map_choice, 0.7, overlay_data=render_crop_overlay(overlay_crop), basemap=get_map_state()["basemap"]
+        )
+        st_folium(map_obj, width=True, height=500, key="peta_tanaman", returned_objects=[])
+
+def patch_analysis():
+    st.markdown("""
+    <div class="main-header">
+        <h2>🧩 Analisis Blok Lahan Berkesinambungan</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.sidebar.markdown("### 🎛️ Kontrol Blok Lahan")
+    class_labels = {name: code for code, name in suitability_class_names.items()}
+    selected_classes = st.sidebar.multiselect(
+        "Kelas yang digabung:",
+        list(class_labels.keys()),
+        default=["S2 - Cukup Sesuai", "S1 - Sangat Sesuai"]
+    )
+    min_area = st.sidebar.number_input("Luas minimum blok (Ha)", min_value=0.0, value=5.0, step=1.0)
+    connectivity = st.sidebar.radio("Konektivitas piksel", [8, 4], format_func=lambda x: f"{x} tetangga")
+    top_n = st.sidebar.slider("Jumlah blok terbesar di peta", 1, 50, 10)
+    
+    if not selected_classes:
+        st.warning("Pilih minimal satu kelas kesesuaian.")
+        return
+    
+    class_codes = tuple(sorted(class_labels[name] for name in selected_classes))
+    try:
+        labels, transform, patches = label_patches(class_codes, connectivity)
+    except Exception as e:
+        st.error(f"Error labeling patches: {str(e)}")
+        return
+    
+    farmable = patches[patches["Luas (Ha)"] >= min_area].sort_values("Luas (Ha)", ascending=False)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Jumlah Blok (semua)", f"{len(patches):,}")
+    with col2:
+        st.metric(f"Blok ≥ {min_area:g} Ha", f"{len(farmable):,}")
+    with col3:
+        st.metric("Luas Blok Layak (Ha)", f"{farmable['Luas (Ha)'].sum():.1f}")
+    with col4:
+        largest = farmable["Luas (Ha)"].max() if len(farmable) else 0
+        st.metric("Blok Terbesar (Ha)", f"{largest:.1f}")
+    
+    if len(farmable) == 0:
+        st.info("Tidak ada blok yang memenuhi luas minimum.")
+        return
+    
+    col1, col2 = st.columns([3, 2])
+    
+    with col1:
+        top_ids = tuple(int(i) for i in farmable["ID"].head(top_n))
+        map_obj = create_interactive_map(
+            layer_options["Kesesuaian Lahan Akhir"], "Kesesuaian Lahan Akhir", 0.5, basemap=get_map_state()["basemap"]
+        )
+        folium.GeoJson(
+            patch_polygons(class_codes, connectivity, top_ids),
+            name=f"{len(top_ids)} Blok Terbesar",
+            style_function=lambda x: {"color": "#0d47a1", "weight": 2, "fillColor": "#42a5f5", "fillOpacity": 0.4},
+            tooltip=folium.GeoJsonTooltip(fields=["ID", "Luas (Ha)"])
+        ).add_to(map_obj)
+        st_folium(map_obj, width=True, height=550, key="peta_blok", returned_objects=[])
+    
+    with col2:
+        fig_hist = px.histogram(
+            farmable,
+            x="Luas (Ha)",
+            nbins=30,
+            log_y=True,
+            title="Distribusi Luas Blok"
+        )
+        st.plotly_chart(fig_hist, use_container_width=True)
+        st.dataframe(
+            farmable.head(top_n).round({"Luas (Ha)": 1, "Lintang": 5, "Bujur": 5}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+def site_selection():
+    st.markdown("""
+    <div class="main-header">
+        <h2>🎯 Pemilihan Lokasi Lahan Terbaik</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.sidebar.markdown("### 🎛️ Kontrol Pemilihan Lokasi")
+    target_ha = st.sidebar.number_input("Target luas (Ha)", min_value=1.0, value=500.0, step=50.0)
+    constrained = st.sidebar.multiselect(
+        "Batasan parameter:",
+        list(parameter_layers.keys()),
+        default=["Kemiringan"],
+        help="Piksel dengan skor parameter di bawah batas minimum tidak dipilih (mis. Kemiringan ≥ 2 = lereng ≤ 25°)"
+    )
+    constraints = tuple(
+        (name, st.sidebar.select_slider(f"Skor minimum {name}", options=list(range(1, MAX_SCORE + 1)), value=2))
+        for name in constrained
+    )
+    min_patch_ha = st.sidebar.number_input("Luas minimum per lokasi (Ha)", min_value=0.0, value=0.0, step=1.0)
+    
+    try:
+        site_labels, transform, sites, summary = select_sites(target_ha, constraints, min_patch_ha)
+    except Exception as e:
+        st.error(f"Error selecting sites: {str(e)}")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Luas Terpilih (Ha)", f"{summary['selected_ha']:,.1f}")
+    with col2:
+        st.metric("Jumlah Lokasi", f"{len(sites):,}")
+    with col3:
+        st.metric("Skor Minimum Terpilih", f"{summary['threshold']:.2f}")
+    with col4:
+        st.metric("Luas Memenuhi Batasan (Ha)", f"{summary['eligible_ha']:,.1f}")
+    
+    if len(sites) == 0:
+        st.info("Tidak ada lokasi yang memenuhi batasan.")
+        return
+    if summary["selected_ha"] < target_ha:
+        st.warning("Lahan yang memenuhi batasan lebih kecil dari target luas.")
+    elif summary["selected_ha"] > target_ha * 1.01:
+        st.info(
+            f"Luas terpilih melebihi target sebesar {summary['selected_ha'] - target_ha:,.1f} Ha karena "
+            f"lokasi hanya dipilih utuh (minimal {min_patch_ha:g} Ha per lokasi)."
+        )
+    
+    geojson = site_polygons(target_ha, constraints, min_patch_ha)
+    col1, col2 = st.columns([3, 2])
+    
+    with col1:
+        score_path = layer_options[SCORE_LAYER]
+        map_obj = create_interactive_map(
+            score_path, SCORE_LAYER, 0.4,
+            overlay_data=render_score_overlay(score_path, classification_methods[0], 4),
+            basemap=get_map_state()["basemap"]
+        )
+        folium.GeoJson(
+            geojson,
+            name="Lokasi Terpilih",
+            style_function=lambda x: {"color": site_color, "weight": 2, "fillColor": site_color, "fillOpacity": 0.5},
+            tooltip=folium.GeoJsonTooltip(fields=["ID", "Luas (Ha)", "Skor Rata-rata"])
+        ).add_to(map_obj)
+        st_folium(map_obj, width=True, height=550, key="peta_lokasi", returned_objects=[])
+    
+    with col2:
+        st.dataframe(
+            sites.round({"Luas (Ha)": 1, "Skor Rata-rata": 3, "Lintang": 5, "Bujur": 5}),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.download_button(
+            "⬇️ Unduh Poligon Lokasi (GeoJSON)",
+            data=json.dumps(geojson),
+            file_name="lokasi_terpilih.geojson",
+            mime="application/geo+json"
+        )
+
+def change_detection():
+    st.markdown("""
+    <div class="main-header">
+        <h2>🔄 Perubahan Kelas Antar Rilis Data</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    releases = list_class_releases()
+    if len(releases) < 2:
+        st.info(
+            f"Hanya ada satu rilis data. Simpan rilis lain sebagai "
+            f"`{RELEASES_DIR}/<versi>/{os.path.basename(layer_options['Kesesuaian Lahan Akhir'])}` untuk dibandingkan."
+        )
+        return
+    
+    versions = list(releases.keys())
+    col1, col2 = st.columns(2)
+    with col1:
+        version_from = st.selectbox("Rilis awal:", versions, index=1)
+    with col2:
+        version_to = st.selectbox("Rilis pembanding:", versions, index=0)
+    
+    if version_from == version_to:
+        st.warning("Pilih dua rilis yang berbeda.")
+        return
+    
+    try:
+        release_stamps = (file_stamp(releases[version_from]), file_stamp(releases[version_to]))
+        matrix, matrix_ha, change, transform = compute_class_transitions(releases[version_from], releases[version_to], release_stamps)
+    except Exception as e:
+        st.error(f"Error comparing releases: {str(e)}")
+        return
+    
+    names = [suitability_class_names[code] for code in range(1, 5)]
+    df_matrix = pd.DataFrame(matrix_ha[1:, 1:], index=names, columns=names)
+    
+    total_ha = matrix_ha[1:, 1:].sum()
+    upgraded_ha = np.triu(matrix_ha[1:, 1:], 1).sum()
+    downgraded_ha = np.tril(matrix_ha[1:, 1:], -1).sum()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Tetap (Ha)", f"{total_ha - upgraded_ha - downgraded_ha:,.1f}")
+    with col2:
+        st.metric("Naik Kelas (Ha)", f"{upgraded_ha:,.1f}")
+    with col3:
+        st.metric("Turun Kelas (Ha)", f"{downgraded_ha:,.1f}")
+    
+    tab1, tab2, tab3 = st.tabs(["🟧 Matriks Transisi", "🔀 Sankey", "🗺️ Peta Perubahan"])
+    
+    with tab1:
+        fig_heat = px.imshow(
+            df_matrix,
+            text_auto=".1f",
+            color_continuous_scale="YlOrRd",
+            labels={"x": f"Kelas {version_to}", "y": f"Kelas {version_from}", "color": "Luas (Ha)"},
+            title="Luas Transisi Kelas (Ha)"
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+        st.dataframe(df_matrix.round(1), use_container_width=True)
+        
+        nodata_ha = matrix_ha[0, 1:].sum() + matrix_ha[1:, 0].sum()
+        if nodata_ha > 0:
+            st.caption(f"{nodata_ha:,.1f} Ha hanya memiliki data di salah satu rilis dan tidak dihitung.")
+    
+    with tab2:
+        sources, targets, values = [], [], []
+        for i in range(4):
+            for j in range(4):
+                if matrix_ha[i + 1, j + 1] > 0:
+                    sources.append(i)
+                    targets.append(4 + j)
+                    values.append(matrix_ha[i + 1, j + 1])
+        fig_sankey = go.Figure(go.Sankey(
+            node=dict(
+                label=[f"{name} ({version_from})" for name in names] + [f"{name} ({version_to})" for name in names],
+                color=class_colors + class_colors,
+                pad=15
+            ),
+            link=dict(source=sources, target=targets, value=values)
+        ))
+        fig_sankey.update_layout(title_text="Aliran Luas Antar Kelas (Ha)")
+        st.plotly_chart(fig_sankey, use_container_width=True)
+    
+    with tab3:
+        map_obj = create_interactive_map(
+            None, "Perubahan Kelas", 0.8,
+            overlay_data=render_transition_overlay(releases[version_from], releases[version_to], release_stamps),
+            basemap=get_map_state()["basemap"]
+        )
+        st_folium(map_obj, width=True, height=550, key="peta_perubahan", returned_objects=[])
+        for color, label in zip(transition_colors, ["Turun kelas", "Tetap", "Naik kelas"]):
+            st.markdown(f"""
+            <span style="background-color:{color}; width:15px; height:15px; display:inline-block; margin-right:5px;"></span>
+            {label}
+            """, unsafe_allow_html=True)
+
 def methodology():
     st.markdown("""
     <div class="main-header">
@@ -542,18 +1140,35 @@ def about_page():
 def get_layer_description(layer_name):
     descriptions = {
         "Kesesuaian Lahan Akhir": "Hasil akhir analisis kesesuaian lahan untuk tanaman kentang berdasarkan semua parameter",
+        "Skor Kesesuaian (Kontinu)": "Skor kesesuaian terbobot sebelum dikelaskan; batas kelas dapat dipilih sendiri",
         "Suhu": "Distribusi suhu rata-rata tahunan yang mempengaruhi pertumbuhan kentang",
         "Ketinggian": "Ketinggian tempat dari permukaan laut yang optimal untuk budidaya kentang",
         "Kemiringan": "Tingkat kemiringan lereng yang mempengaruhi drainase dan erosi",
         "pH Tanah": "Tingkat keasaman tanah yang mempengaruhi ketersediaan nutrisi",
         "Curah Hujan": "Distribusi curah hujan tahunan untuk kebutuhan air tanaman",
         "Tekstur Tanah": "Komposisi partikel tanah yang mempengaruhi drainase dan aerasi",
-        "Tutupan Lahan": "Jenis penggunaan lahan saat ini di area studi"
+        "Tutupan Lahan": "Jenis penggunaan lahan saat ini di area studi",
+        "Faktor Pembatas": "Parameter dengan kekurangan skor terbobot terbesar, relatif terhadap rentang skornya di area studi, pada setiap piksel (profil kentang)"
     }
     return descriptions.get(layer_name, "Deskripsi tidak tersedia")
 
-def display_legend(layer_name):
-    if layer_name == "Kesesuaian Lahan Akhir":
+def display_legend(layer_name, score_classing=None):
+    if score_classing is not None:
+        df_classes = score_classes(layer_options[layer_name], *score_classing)
+        items = "".join(
+            f"""
+            <div style="margin:5px 0;">
+                <span style="background-color:{color}; width:15px; height:15px; display:inline-block; margin-right:5px;"></span>
+                {row['Rentang Skor']}
+            </div>"""
+            for color, (_, row) in zip(score_colors(len(df_classes)), df_classes.iterrows())
+        )
+        st.sidebar.markdown(f"""
+        ### 🎨 Legenda Skor ({score_classing[0]})
+        <div style="font-size:14px;">{items}
+        </div>
+        """, unsafe_allow_html=True)
+    elif layer_name == "Kesesuaian Lahan Akhir":
         st.sidebar.markdown("""
         ### 🎨 Legenda Kesesuaian Akhir
         <div style="font-size:14px;">
@@ -575,21 +1190,1027 @@ def display_legend(layer_name):
             </div>
         </div>
         """, unsafe_allow_html=True)
+    elif layer_name == "Faktor Pembatas":
+        weights = crop_profiles["Kentang"]["weights"]
+        items = "".join(
+            f"""
+            <div style="margin:5px 0;">
+                <span style="background-color:{parameter_colors[code - 1]}; width:15px; height:15px; display:inline-block; margin-right:5px;"></span>
+                {name}
+            </div>"""
+            for code, name in limiting_factor_names().items() if weights.get(name, 1) > 0
+        )
+        st.sidebar.markdown(f"""
+        ### 🎨 Legenda Faktor Pembatas
+        <div style="font-size:14px;">{items}
+        </div>
+        """, unsafe_allow_html=True)
+
+# === Akses Raster (stack bersama atau GeoTIFF) ===
+
+@st.cache_resource
+def load_raster_store():
+    # Stack dibangun dengan `python raster_store.py`; satu memmap dipakai bersama
+    # semua sesi di proses ini dan page cache-nya dibagi antar proses worker.
+    try:
+        return raster_store.open_store(raster_store.DEFAULT_STORE_PATH)
+    except (FileNotFoundError, ValueError):
+        return None
+
+@st.cache_resource(show_spinner=False)
+def start_tile_server():
+    # One tile server per process for the local basemap and vector tiles; when
+    # another worker already holds the port the existing server is reused. The
+    # server only listens on 127.0.0.1, so the browser-facing base URL must be
+    # configured with PPL_TILE_URL (e.g. "/tiles-proxy" on the same reverse proxy
+    # as Streamlit, or http://localhost:8765 for a single local user). Without it
+    # the local basemap and vector tiles are not offered.
+    base_url = os.environ.get("PPL_TILE_URL")
+    if not base_url:
+        return None
+    try:
+        sources = tile_server.open_sources()
+        if not sources:
+            return None
+        server = tile_server.start_server()
+        if server is not None:
+            sources = server.sources
+    except Exception:
+        return None
+    return {"base_url": base_url.rstrip("/"), "sources": sources}
+
+def start_local_basemap():
+    server = start_tile_server()
+    if server is None or "tiles" not in server["sources"]:
+        return None
+    source = server["sources"]["tiles"]
+    return {
+        "url": f"{server['base_url']}/tiles/{{z}}/{{x}}/{{y}}",
+        "attribution": source.attribution,
+        "min_zoom": source.min_zoom,
+        "max_zoom": source.max_zoom
+    }
+
+def vector_tile_source(raster_path):
+    # Vector tiles built by vector_tiles.py are named after the raster file
+    server = start_tile_server()
+    if server is None or raster_path is None or raster_path.startswith(DERIVED_PREFIX):
+        return None
+    prefix = "vt/" + os.path.splitext(os.path.basename(raster_path))[0]
+    if prefix not in server["sources"]:
+        return None
+    return {
+        "url": f"{server['base_url']}/{prefix}/{{z}}/{{x}}/{{y}}.pbf",
+        "max_zoom": server["sources"][prefix].max_zoom
+    }
+
+@st.cache_resource(show_spinner=False)
+def load_boundary(shp_path, bbox=None):
+    # Shared read-only GeoDataFrame (EPSG:4326) for every session. Only features
+    # intersecting bbox (default: the raster extent) are read, through the spatial
+    # index of the boundary store when `python boundary_store.py` has built one.
+    if bbox is None:
+        bbox = raster_store.reference_bounds()
+    return boundary_store.load_boundaries(boundary_store.resolve(shp_path), bbox)
+
+def read_clipped_raster(raster_path, gdf):
+    if raster_path.startswith(DERIVED_PREFIX):
+        codes, transform = read_derived_layer(raster_path)
+        data = codes.astype(np.float64)
+        data[(codes == 0) | ~load_boundary_mask()] = np.nan
+        return data, transform
+    
+    store = load_raster_store()
+    # Layers resampled onto the stack grid are read from their native GeoTIFF for display
+    if store is not None and store.has_native_layer(raster_path) and store.boundary() is not None:
+        return store.read_float(raster_path, store.boundary()), store.transform
+    
+    with rasterio.open(raster_path) as src:
+        # Clip raster to shapefile
+        gdf_utm = gdf.to_crs(src.crs)  # Reproject shapefile to raster CRS
+        shapes = [geom for geom in gdf_utm.geometry]
+        out_image, out_transform = mask(src, shapes, crop=True, nodata=src.nodata)
+        data = out_image[0]  # First band
+        
+        # Handle nodata values properly
+        if src.nodata is not None:
+            data = np.where(data == src.nodata, np.nan, data)
+        
+        # Ensure data is float to handle NaN properly
+        return data.astype(np.float64), out_transform
+
+def sample_raster_value(raster_path, lon, lat):
+    if raster_path.startswith(DERIVED_PREFIX):
+        codes, transform = read_derived_layer(raster_path)
+        row, col = rasterio.transform.rowcol(transform, lon, lat)
+        if not (0 <= row < codes.shape[0] and 0 <= col < codes.shape[1]):
+            raise IndexError("Koordinat di luar raster")
+        return codes[row, col] if codes[row, col] != 0 else np.nan
+    
+    store = load_raster_store()
+    if store is not None and store.has_native_layer(raster_path):
+        return store.sample(raster_path, lon, lat)
+    
+    with rasterio.open(raster_path) as src:
+        row, col = src.index(lon, lat)
+        if not (0 <= row < src.height and 0 <= col < src.width):
+            raise IndexError("Koordinat di luar raster")
+        # Read only the clicked pixel instead of the whole band
+        return src.read(1, window=((row, row + 1), (col, col + 1)))[0, 0]
+
+@st.cache_data(show_spinner=False)
+def raster_value_counts(raster_path):
+    # Distinct values with pixel counts and area (Ha) as a weighted sum of geodesic pixel areas
+    if raster_path.startswith(DERIVED_PREFIX):
+        codes, transform = read_derived_layer(raster_path)
+        counts = np.bincount(codes.ravel(), minlength=256)
+        areas = np.bincount(codes.ravel(), weights=load_pixel_areas().ravel(), minlength=256)
+        counts[0] = 0
+        values = np.nonzero(counts)[0]
+        return values.astype(np.float64), counts[values], areas[values] / 10000
+    
+    store = load_raster_store()
+    if store is not None and store.has_native_layer(raster_path):
+        values, counts, areas = store.value_areas(raster_path)
+        return values, counts, areas / 10000
+    
+    with rasterio.open(raster_path) as src:
+        data = src.read(1)
+        valid = np.isfinite(data) if src.nodata is None else (data != src.nodata) & np.isfinite(data)
+        values, inverse, counts = np.unique(data[valid], return_inverse=True, return_counts=True)
+        pixel_areas = pixel_areas_m2(src.transform, data.shape, src.crs)
+        areas = np.bincount(inverse, weights=pixel_areas[valid], minlength=len(values))
+        return values, counts, areas / 10000
+
+def raster_class_table(df, raster_path):
+    # One row per value in the raster, with Piksel, Persentase and Luas (Ha) from
+    # the same grid as the map statistics. The CSV only supplies the class labels
+    # for each Skor; values it does not list get a generic label. The CSV figures
+    # are used as they are only when the raster cannot be read.
+    try:
+        values, counts, area_ha = raster_value_counts(raster_path)
+    except Exception:
+        df = df.copy()
+        df['Luas (Ha)'] = df['Area_km2'] * 100
+        return df
+    
+    labels = dict(zip(df['Skor'], df['Kelas']))
+    return pd.DataFrame({
+        'Kelas': [labels.get(value, f"Skor {value:g}") for value in values],
+        'Skor': values,
+        'Piksel': np.asarray(counts, dtype=np.int64),
+        'Persentase': np.asarray(counts) / np.sum(counts) * 100 if len(counts) else np.zeros(0),
+        'Area_km2': np.asarray(area_ha) / 100,
+        'Luas (Ha)': area_ha
+    })
+
+@st.cache_resource(show_spinner=False)
+def load_boundary_mask():
+    # Boolean mask of the study area on the aligned (class raster) grid
+    store = load_raster_store()
+    if store is not None and store.boundary() is not None:
+        return store.boundary()
+    ref = raster_store.reference_grid()
+    gdf = load_boundary(SHP_PATH).to_crs(ref["crs"])
+    return ~geometry_mask(list(gdf.geometry), out_shape=(ref["height"], ref["width"]), transform=ref["transform"])
+
+@st.cache_resource(show_spinner=False)
+def load_parameter_codes():
+    # Parameter scores as uint8 codes (0 = nodata) aligned to the class raster grid
+    store = load_raster_store()
+    if store is not None and all(store.has_layer(path) for path in parameter_layers.values()):
+        return {name: store.layer(path) for name, path in parameter_layers.items()}, store.transform
+    
+    ref = raster_store.reference_grid()
+    codes = {name: raster_store.align_layer(path, ref) for name, path in parameter_layers.items()}
+    for name, data in codes.items():
+        if data.dtype != np.uint8:
+            raise ValueError(f"Layer {name} bukan raster skor diskrit")
+    return codes, ref["transform"]
+
+@st.cache_resource(show_spinner=False)
+def evaluate_crop_profiles():
+    # Score every crop profile in one pass over the parameter stack: for each
+    # parameter a (crop x code) lookup table of weight * rescored value is
+    # gathered with the pixel codes, so all crops are accumulated together.
+    # As in compute_limiting_factor, a parameter with zero weight in a profile
+    # never makes a pixel unscorable for that crop.
+    codes, transform = load_parameter_codes()
+    inside = load_boundary_mask()
+    crops = list(crop_profiles.keys())
+    shape = next(iter(codes.values())).shape
+    
+    scores = np.zeros((len(crops),) + shape, dtype=np.float32)
+    valid = np.ones((len(crops),) + shape, dtype=bool)
+    for name in SCORE_SUM_ORDER:
+        layer = codes[name]
+        if name in SOURCE_NODATA_SCORES:
+            layer = np.where((layer == raster_store.NODATA) & inside, SOURCE_NODATA_SCORES[name], layer).astype(np.uint8)
+        lut = np.zeros((len(crops), 256), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            profile = crop_profiles[crop]
+            rescore = profile["rescore"].get(name, {})
+            lut[i] = np.float32(profile["weights"][name]) * np.array([rescore.get(code, code) for code in range(256)], dtype=np.float32)
+            if profile["weights"][name] > 0:
+                valid[i] &= layer != raster_store.NODATA
+        scores += lut[:, layer]
+    
+    # Classes are taken from the float32 sums as they are, the same precision as
+    # the shipped score raster, so a score of exactly 2.4 lands where it does there
+    classes = np.zeros((len(crops),) + shape, dtype=np.uint8)
+    rank = np.full((len(crops),) + shape, -np.inf, dtype=np.float32)
+    for i, crop in enumerate(crops):
+        profile = crop_profiles[crop]
+        valid[i] &= scores[i] >= profile.get("min_score", 0)
+        crop_class = np.digitize(scores[i], profile["class_breaks"]) + 1
+        classes[i][valid[i]] = crop_class[valid[i]]
+        # Best crop: highest class first, then highest score normalised by total weight
+        rank[i][valid[i]] = crop_class[valid[i]] * 10 + scores[i][valid[i]] / sum(profile["weights"].values())
+    scores[~valid] = np.nan
+    
+    # The best crop is only picked where every profile could be scored
+    all_valid = valid.all(axis=0)
+    best = np.zeros(shape, dtype=np.uint8)
+    best[all_valid] = np.argmax(rank[:, all_valid], axis=0) + 1
+    
+    return {"crops": crops, "scores": scores, "classes": classes, "best": best, "transform": transform}
+
+@st.cache_resource(show_spinner=False)
+def compute_limiting_factor():
+    # Limiting factor = parameter with the largest weighted shortfall under the
+    # Kentang profile. Each shortfall is normalised by the range the parameter
+    # actually reaches in the study area, w * (best - score) / (best - worst), so a
+    # parameter whose scores only span 1-2 is not always "furthest from 5".
+    # Parameters with zero weight or a single score never limit. Codes are 1-based
+    # indices into parameter_layers, plus TIED_FACTOR where several parameters share
+    # the largest shortfall and NO_FACTOR where every parameter is at its best.
+    codes, transform = load_parameter_codes()
+    profile = crop_profiles["Kentang"]
+    names = list(parameter_layers.keys())
+    
+    shortfall = np.zeros((len(names),) + next(iter(codes.values())).shape, dtype=np.float64)
+    valid = np.ones(shortfall.shape[1:], dtype=bool)
+    for name in names:
+        if profile["weights"][name] > 0:
+            valid &= codes[name] != raster_store.NODATA
+    for i, name in enumerate(names):
+        weight = profile["weights"][name]
+        if weight <= 0:
+            continue
+        rescore = profile["rescore"].get(name, {})
+        lut = np.array([rescore.get(code, code) for code in range(256)], dtype=np.float64)
+        score = lut[codes[name]]
+        best, worst = score[valid].max(), score[valid].min()
+        if best > worst:
+            shortfall[i] = weight * (best - score) / (best - worst)
+    
+    largest = shortfall.max(axis=0)
+    tied = np.isclose(shortfall, largest, rtol=0, atol=1e-9).sum(axis=0) > 1
+    factor = np.zeros(valid.shape, dtype=np.uint8)
+    factor[valid] = np.argmax(shortfall[:, valid], axis=0) + 1
+    factor[valid & tied] = TIED_FACTOR
+    factor[valid & (largest <= 0)] = NO_FACTOR
+    return factor, transform
+
+def read_derived_layer(raster_path):
+    if raster_path == "derived:limiting_factor":
+        return compute_limiting_factor()
+    raise ValueError(f"Layer turunan tidak dikenal: {raster_path}")
+
+def limiting_factor_names():
+    names = {i + 1: name for i, name in enumerate(parameter_layers.keys())}
+    names[TIED_FACTOR] = "Beberapa faktor (seri)"
+    names[NO_FACTOR] = "Tidak ada pembatas"
+    return names
+
+@st.cache_data(show_spinner=False)
+def crop_class_statistics(crop):
+    result = evaluate_crop_profiles()
+    classes = result["classes"][result["crops"].index(crop)]
+    inside = load_boundary_mask()
+    counts = np.bincount(classes[inside].ravel(), minlength=5)[1:5]
+    areas = np.bincount(classes[inside].ravel(), weights=load_pixel_areas()[inside], minlength=5)[1:5]
+    total = counts.sum()
+    return pd.DataFrame({
+        "Kelas": [suitability_class_names[code] for code in range(1, 5)],
+        "Skor": range(1, 5),
+        "Piksel": counts,
+        "Persentase": counts / total * 100 if total else np.zeros(4),
+        "Luas (Ha)": areas / 10000
+    })
+
+@st.cache_data(show_spinner=False)
+def best_crop_statistics():
+    result = evaluate_crop_profiles()
+    inside = load_boundary_mask()
+    counts = np.bincount(result["best"][inside].ravel(), minlength=len(result["crops"]) + 1)[1:]
+    areas = np.bincount(result["best"][inside].ravel(), weights=load_pixel_areas()[inside], minlength=len(result["crops"]) + 1)[1:]
+    total = counts.sum()
+    return pd.DataFrame({
+        "Tanaman": result["crops"],
+        "Piksel": counts,
+        "Persentase": counts / total * 100 if total else np.zeros(len(counts)),
+        "Luas (Ha)": areas / 10000
+    })
+
+@st.cache_data(show_spinner=False)
+def render_crop_overlay(crop):
+    # crop=None renders the best-crop-per-pixel layer
+    result = evaluate_crop_profiles()
+    if crop is None:
+        data = result["best"].astype(np.float64)
+        colors = [crop_profiles[name]["color"] for name in result["crops"]]
+    else:
+        data = result["classes"][result["crops"].index(crop)].astype(np.float64)
+        colors = class_colors
+    data[(data == 0) | ~load_boundary_mask()] = np.nan
+    return colorize_overlay(data, result["transform"], colors)
+
+# === Skor Kontinu ===
+
+@st.cache_resource(show_spinner=False)
+def load_score_bins(raster_path):
+    # One pass over the pixels: a fixed-width bin index per pixel and the histogram.
+    # Class breaks are snapped to bin edges, so reclassing, recoloring and area
+    # totals only touch the SCORE_BINS-long histogram, never the raster again.
+    data, transform = read_clipped_raster(raster_path, load_boundary(SHP_PATH))
+    valid = np.isfinite(data)
+    lo, hi = data[valid].min(), data[valid].max()
+    hi = max(hi, lo + 1e-6)
+    edges = np.linspace(lo, hi, SCORE_BINS + 1)
+    
+    bins = np.full(data.shape, -1, dtype=np.int16)
+    bins[valid] = np.clip(((data[valid] - lo) / (hi - lo) * SCORE_BINS).astype(np.int32), 0, SCORE_BINS - 1)
+    counts = np.bincount(bins[valid], minlength=SCORE_BINS)
+    pixel_areas = pixel_areas_m2(transform, data.shape, raster_crs(raster_path))
+    bin_area_ha = np.bincount(bins[valid], weights=pixel_areas[valid], minlength=SCORE_BINS) / 10000
+    return {"bins": bins, "counts": counts, "area_ha": bin_area_ha, "edges": edges, "transform": transform}
+
+def natural_breaks(counts, edges, n_classes):
+    # Jenks on the histogram: bin centers weighted by pixel count, optimal
+    # partition by dynamic programming over the non-empty bins
+    nonempty = np.nonzero(counts)[0]
+    if len(nonempty) <= n_classes:
+        return nonempty[1:]
+    x = (edges[nonempty] + edges[nonempty + 1]) / 2
+    w = counts[nonempty].astype(np.float64)
+    cw = np.concatenate([[0], np.cumsum(w)])
+    cwx = np.concatenate([[0], np.cumsum(w * x)])
+    cwxx = np.concatenate([[0], np.cumsum(w * x * x)])
+    
+    m = len(nonempty)
+    cost = np.full((n_classes + 1, m + 1), np.inf)
+    cost[0, 0] = 0
+    start = np.zeros((n_classes + 1, m + 1), dtype=np.int64)
+    for k in range(1, n_classes + 1):
+        for j in range(k, m + 1):
+            i = np.arange(k - 1, j)
+            sw = cw[j] - cw[i]
+            ssd = (cwxx[j] - cwxx[i]) - (cwx[j] - cwx[i]) ** 2 / sw
+            total = cost[k - 1, i] + ssd
+            best = np.argmin(total)
+            cost[k, j] = total[best]
+            start[k, j] = i[best]
+    
+    starts = []
+    j = m
+    for k in range(n_classes, 0, -1):
+        j = start[k, j]
+        starts.append(j)
+    return nonempty[sorted(starts)[1:]]
+
+def score_class_breaks(counts, edges, method, n_classes):
+    # Inner class breaks as bin-edge indices: bins >= breaks[k-1] belong to class k+1
+    if method == "Kuantil":
+        cumulative = np.cumsum(counts)
+        breaks = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, n_classes) / n_classes) + 1
+    elif method == "Natural Breaks (Jenks)":
+        breaks = natural_breaks(counts, edges, n_classes)
+    else:
+        breaks = np.round(np.linspace(0, SCORE_BINS, n_classes + 1)[1:-1]).astype(np.int64)
+    # Heavily tied scores can merge quantile breaks; empty classes are dropped
+    return np.unique(np.clip(breaks, 1, SCORE_BINS - 1))
+
+def score_bin_classes(raster_path, method, n_classes):
+    score = load_score_bins(raster_path)
+    breaks = score_class_breaks(score["counts"], score["edges"], method, n_classes)
+    return breaks, np.searchsorted(breaks, np.arange(SCORE_BINS), side="right") + 1
+
+def score_colors(n_classes):
+    return [to_hex(c) for c in plt.cm.RdYlGn(np.linspace(0.05, 0.95, n_classes))]
+
+@st.cache_data(show_spinner=False)
+def score_classes(raster_path, method, n_classes):
+    score = load_score_bins(raster_path)
+    breaks, bin_class = score_bin_classes(raster_path, method, n_classes)
+    n = len(breaks) + 1
+    pixels = np.bincount(bin_class, weights=score["counts"], minlength=n + 1)[1:]
+    area_ha = np.bincount(bin_class, weights=score["area_ha"], minlength=n + 1)[1:]
+    bounds = score["edges"][np.concatenate([[0], breaks, [SCORE_BINS]])]
+    return pd.DataFrame({
+        "Kelas": np.arange(1, n + 1),
+        "Rentang Skor": [f"{bounds[k]:.2f} – {bounds[k + 1]:.2f}" for k in range(n)],
+        "Piksel": pixels.astype(np.int64),
+        "Persentase": pixels / pixels.sum() * 100,
+        "Luas (Ha)": area_ha
+    })
+
+@st.cache_data(show_spinner=False)
+def render_score_overlay(raster_path, method, n_classes):
+    # Recolor = lookup of the per-bin class through the cached bin index
+    score = load_score_bins(raster_path)
+    breaks, bin_class = score_bin_classes(raster_path, method, n_classes)
+    data = np.where(score["bins"] >= 0, bin_class[score["bins"]], np.nan)
+    return colorize_overlay(data, score["transform"], score_colors(len(breaks) + 1))
+
+# === Prefetch Layer ===
+
+def process_rss_mb():
+    # Resident memory of this process (Linux /proc); None when unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return None
+
+def prefetch_layer(layer_name, cancelled=lambda: False):
+    # Same cached calls the map and statistics panels make, so the next switch is a cache hit.
+    # cancelled() is checked between the calls: each finished call stays cached, the rest
+    # is skipped. Returns False when the layer was abandoned part-way.
+    raster_path = layer_options[layer_name]
+    steps = []
+    if layer_name == SCORE_LAYER:
+        steps.append(lambda: load_score_bins(raster_path))
+        steps.append(lambda: render_score_overlay(raster_path, classification_methods[0], 4))
+        steps.append(lambda: score_classes(raster_path, classification_methods[0], 4))
+    else:
+        if raster_path.startswith(DERIVED_PREFIX):
+            steps.append(lambda: read_derived_layer(raster_path))
+        # Layers drawn from vector tiles never need the PNG overlay
+        if vector_tile_source(raster_path) is None:
+            steps.append(lambda: render_raster_overlay(raster_path))
+        steps.append(lambda: raster_value_counts(raster_path))
+    for step in steps:
+        if cancelled():
+            return False
+        step()
+    return True
+
+def layer_stamp(layer_name):
+    # Identity of a layer's data: its path with the (mtime, size) of the file, or of
+    # the parameter layers a derived layer is computed from; None when a file is missing
+    raster_path = layer_options[layer_name]
+    sources = parameter_layers.values() if raster_path.startswith(DERIVED_PREFIX) else [raster_path]
+    try:
+        return raster_path, tuple(file_stamp(path) for path in sources)
+    except OSError:
+        return None
+
+class LayerPrefetcher:
+    # One daemon worker per process warms the shared st.cache_data entries of
+    # the layers users most often open next (learned from layer switches across
+    # sessions), falling back to the neighbours in layer_options order.
+    # Each schedule() drops the work queued for the previous layer and cancels
+    # the layer being rendered (between its cached steps) unless it is still a
+    # candidate. Warm layers are remembered by layer_stamp, so a layer file
+    # replaced on disk is prefetched again.
+    def __init__(self):
+        self.transitions = defaultdict(Counter)
+        self.pending = []
+        self.warm = set()
+        self.current = None
+        self.last_foreground = time.monotonic()
+        self.stats = {"selesai": 0, "dibatalkan": 0, "dilewati (memori)": 0}
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        threading.Thread(target=self._run, name="layer-prefetch", daemon=True).start()
+    
+    def touch(self):
+        self.last_foreground = time.monotonic()
+    
+    def record_switch(self, previous, current):
+        if previous != current and previous in layer_options:
+            with self._cond:
+                self.transitions[previous][current] += 1
+    
+    def candidates(self, layer_name):
+        names = list(layer_options.keys())
+        index = names.index(layer_name)
+        frequent = [name for name, _ in self.transitions[layer_name].most_common()]
+        adjacent = [names[(index + 1) % len(names)], names[(index - 1) % len(names)]]
+        ordered = []
+        for name in frequent + adjacent:
+            if name != layer_name and name not in ordered:
+                ordered.append(name)
+        return ordered[:PREFETCH_DEPTH]
+    
+    def schedule(self, layer_name):
+        with self._cond:
+            self.warm.add(layer_stamp(layer_name))
+            self.stats["dibatalkan"] += len(self.pending)
+            candidates = self.candidates(layer_name)
+            if self.current is not None and self.current not in candidates:
+                self._cancel.set()
+            self.pending = [
+                name for name in candidates
+                if name != self.current and layer_stamp(name) not in self.warm
+            ]
+            self.touch()
+            self._cond.notify()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.pending:
+                    self._cond.wait()
+                # Foreground reruns get the CPU: wait until the app has been quiet
+                idle = time.monotonic() - self.last_foreground
+                if idle < PREFETCH_IDLE_S:
+                    self._cond.wait(PREFETCH_IDLE_S - idle)
+                    continue
+                rss = process_rss_mb()
+                if rss is not None and rss > PREFETCH_MAX_RSS_MB:
+                    self.stats["dilewati (memori)"] += len(self.pending)
+                    self.pending = []
+                    continue
+                layer_name = self.pending.pop(0)
+                stamp = layer_stamp(layer_name)
+                self.current = layer_name
+                self._cancel.clear()
+            
+            cpu_start = time.thread_time()
+            try:
+                done = prefetch_layer(layer_name, self._cancel.is_set)
+            except Exception:
+                done = False
+            cpu_used = time.thread_time() - cpu_start
+            
+            with self._cond:
+                self.current = None
+                if done:
+                    self.warm.add(stamp)
+                    self.stats["selesai"] += 1
+                elif self._cancel.is_set():
+                    self.stats["dibatalkan"] += 1
+            # Keep the worker's duty cycle under PREFETCH_CPU_SHARE
+            time.sleep(cpu_used * (1 / PREFETCH_CPU_SHARE - 1))
+
+@st.cache_resource(show_spinner=False)
+def start_layer_prefetcher():
+    return LayerPrefetcher() if PREFETCH_ENABLED else None
+
+@st.cache_resource(show_spinner=False)
+def grid_row_areas(transform, height, crs_wkt):
+    # Geodesic area of one pixel in each row (m²), computed once per grid
+    return raster_store.pixel_area_rows(rasterio.Affine(*transform), height, rasterio.crs.CRS.from_wkt(crs_wkt))
+
+def pixel_areas_m2(transform, shape, crs):
+    # Per-pixel area view broadcast from the per-row vector: the area of any
+    # mask or class is a weighted sum (bincount with these weights)
+    rows = grid_row_areas(tuple(transform)[:6], shape[0], crs.to_wkt())
+    return np.broadcast_to(rows[:, None], shape)
+
+def load_pixel_areas():
+    # Pixel areas on the aligned (class raster) grid
+    store = load_raster_store()
+    if store is not None:
+        return store.pixel_areas()
+    ref = raster_store.reference_grid()
+    return pixel_areas_m2(ref["transform"], (ref["height"], ref["width"]), ref["crs"])
+
+def raster_crs(raster_path):
+    # Derived layers and stack layers share the aligned grid's CRS
+    store = load_raster_store()
+    if raster_path.startswith(DERIVED_PREFIX) or (store is not None and store.has_native_layer(raster_path)):
+        return store.crs if store is not None else raster_store.reference_grid()["crs"]
+    with rasterio.open(raster_path) as src:
+        return src.crs
 
-def create_interactive_map(raster_path, layer_name, opacity):
+@st.cache_data(show_spinner=False)
+def label_patches(class_codes, connectivity):
+    # Connected regions of the selected classes inside the study area (cached per selection)
+    raster_path = layer_options["Kesesuaian Lahan Akhir"]
+    data, transform = read_clipped_raster(raster_path, load_boundary(SHP_PATH))
+    with rasterio.open(raster_path) as src:
+        crs = src.crs
+    
+    structure = np.ones((3, 3), dtype=bool) if connectivity == 8 else None
+    labels, n_patches = ndimage.label(np.isin(data, class_codes), structure=structure)
+    
+    # Per-patch pixel count and centroid in one bincount pass each
+    rows, cols = np.indices(labels.shape)
+    pixels = np.bincount(labels.ravel(), minlength=n_patches + 1)
+    areas = np.bincount(labels.ravel(), weights=pixel_areas_m2(transform, labels.shape, crs).ravel(), minlength=n_patches + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        row_mean = np.bincount(labels.ravel(), weights=rows.ravel(), minlength=n_patches + 1) / pixels
+        col_mean = np.bincount(labels.ravel(), weights=cols.ravel(), minlength=n_patches + 1) / pixels
+    lon, lat = rasterio.transform.xy(transform, row_mean[1:], col_mean[1:])
+    
+    patches = pd.DataFrame({
+        "ID": np.arange(1, n_patches + 1),
+        "Piksel": pixels[1:],
+        "Luas (Ha)": areas[1:] / 10000,
+        "Lintang": lat,
+        "Bujur": lon
+    })
+    return labels.astype(np.int32), transform, patches
+
+@st.cache_data(show_spinner=False)
+def patch_polygons(class_codes, connectivity, patch_ids):
+    # Vectorize only the requested patches into a GeoJSON FeatureCollection with
+    # one feature per patch. Polygons are traced with the connectivity used for
+    # labelling; any parts still returned separately are joined into a
+    # MultiPolygon so a patch's area is never counted twice.
+    labels, transform, patches = label_patches(class_codes, connectivity)
+    areas = patches.set_index("ID")["Luas (Ha)"]
+    selected = np.where(np.isin(labels, patch_ids), labels, 0)
+    parts = defaultdict(list)
+    for geom, value in shapes(selected, mask=selected > 0, connectivity=connectivity, transform=transform):
+        parts[int(value)].append(geom["coordinates"])
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": rings[0]} if len(rings) == 1 else {"type": "MultiPolygon", "coordinates": rings},
+            "properties": {"ID": patch_id, "Luas (Ha)": round(float(areas[patch_id]), 1)}
+        }
+        for patch_id, rings in parts.items()
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+@st.cache_resource(show_spinner=False)
+def load_score_grid():
+    # Continuous score on the aligned grid (same pixels as the parameter codes), NaN outside the study area
+    raster_path = layer_options[SCORE_LAYER]
+    store = load_raster_store()
+    if store is not None and store.has_layer(raster_path):
+        data = store.read_float(raster_path).astype(np.float64)
+    else:
+        data = raster_store.align_layer(raster_path, raster_store.reference_grid()).astype(np.float64)
+        data[data == raster_store.NODATA] = np.nan
+    data[~load_boundary_mask()] = np.nan
+    return data
+
+@st.cache_data(show_spinner=False)
+def select_sites(target_ha, constraints, min_patch_ha):
+    # Highest-scoring eligible pixels up to the target area. Partial selection:
+    # argpartition picks just enough top pixels and only those are sorted.
+    # Sites smaller than min_patch_ha are dropped and the lost area is
+    # selected again from deeper in the ranking; sites are only kept or dropped
+    # whole, so any overshoot is trimmed back site by site afterwards.
+    score = load_score_grid()
+    codes, transform = load_parameter_codes()
+    pixel_areas = load_pixel_areas()
+    
+    eligible = np.isfinite(score)
+    for name, min_score in constraints:
+        eligible &= codes[name] >= min_score
+    candidates = np.flatnonzero(eligible)
+    candidate_score = score.ravel()[candidates]
+    candidate_area = pixel_areas.ravel()[candidates]
+    
+    target_m2 = target_ha * 10000
+    need_m2 = target_m2
+    structure = np.ones((3, 3), dtype=bool)
+    labels = np.zeros(score.shape, dtype=np.int32)
+    keep = np.zeros(1, dtype=bool)
+    for _ in range(SITE_MAX_ROUNDS):
+        if len(candidates) == 0:
+            break
+        k = min(len(candidates), int(np.ceil(need_m2 / candidate_area.min())))
+        top = np.argpartition(-candidate_score, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-candidate_score[top], kind="stable")]
+        top = top[:np.searchsorted(np.cumsum(candidate_area[top]), need_m2) + 1]
+        
+        selected = np.zeros(score.size, dtype=bool)
+        selected[candidates[top]] = True
+        labels, n_sites = ndimage.label(selected.reshape(score.shape), structure=structure)
+        site_area = np.bincount(labels.ravel(), weights=pixel_areas.ravel(), minlength=n_sites + 1)
+        keep = site_area >= min_patch_ha * 10000
+        keep[0] = False
+        selected_m2 = site_area[keep].sum()
+        if selected_m2 >= target_m2 or len(top) == len(candidates):
+            break
+        need_m2 += target_m2 - selected_m2
+    
+    # Re-selection can overshoot the target by whole sites: drop the lowest-scoring
+    # sites that are not needed to reach it (what remains is reported as overshoot)
+    if keep.any():
+        site_pixels = np.bincount(labels.ravel(), minlength=len(keep))
+        site_score = np.bincount(labels.ravel(), weights=np.nan_to_num(score).ravel(), minlength=len(keep)) / np.maximum(site_pixels, 1)
+        kept_ids = np.flatnonzero(keep)
+        selected_m2 = site_area[keep].sum()
+        for site in kept_ids[np.argsort(site_score[kept_ids], kind="stable")]:
+            if selected_m2 - site_area[site] >= target_m2:
+                keep[site] = False
+                selected_m2 -= site_area[site]
+    
+    # Renumber the kept sites 1..n
+    new_ids = np.zeros(len(keep), dtype=np.int32)
+    new_ids[keep] = np.arange(1, keep.sum() + 1)
+    site_labels = new_ids[labels]
+    n_sites = int(keep.sum())
+    
+    flat = site_labels.ravel()
+    rows, cols = np.indices(site_labels.shape)
+    pixels = np.bincount(flat, minlength=n_sites + 1)
+    areas = np.bincount(flat, weights=pixel_areas.ravel(), minlength=n_sites + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_score = np.bincount(flat, weights=np.nan_to_num(score).ravel(), minlength=n_sites + 1) / pixels
+        row_mean = np.bincount(flat, weights=rows.ravel(), minlength=n_sites + 1) / pixels
+        col_mean = np.bincount(flat, weights=cols.ravel(), minlength=n_sites + 1) / pixels
+    lon, lat = rasterio.transform.xy(transform, row_mean[1:], col_mean[1:])
+    
+    sites = pd.DataFrame({
+        "ID": np.arange(1, n_sites + 1),
+        "Luas (Ha)": areas[1:] / 10000,
+        "Skor Rata-rata": mean_score[1:],
+        "Lintang": lat,
+        "Bujur": lon
+    }).sort_values("Skor Rata-rata", ascending=False)
+    summary = {
+        "selected_ha": areas[1:].sum() / 10000,
+        "eligible_ha": candidate_area.sum() / 10000,
+        "threshold": float(score[site_labels > 0].min()) if n_sites else float("nan")
+    }
+    return site_labels, transform, sites, summary
+
+@st.cache_data(show_spinner=False)
+def site_polygons(target_ha, constraints, min_patch_ha):
+    # Selected sites as a GeoJSON FeatureCollection (map layer and download)
+    site_labels, transform, sites, _ = select_sites(target_ha, constraints, min_patch_ha)
+    props = sites.set_index("ID")
+    features = [
+        {
+            "type": "Feature",
+            "geometry": geom,
+            "properties": {
+                "ID": int(value),
+                "Luas (Ha)": round(float(props.at[int(value), "Luas (Ha)"]), 2),
+                "Skor Rata-rata": round(float(props.at[int(value), "Skor Rata-rata"]), 3)
+            }
+        }
+        for geom, value in shapes(site_labels, mask=site_labels > 0, connectivity=8, transform=transform)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+def list_class_releases():
+    # Version name -> class raster path, current data first
+    class_file = os.path.basename(layer_options["Kesesuaian Lahan Akhir"])
+    releases = {CURRENT_RELEASE: layer_options["Kesesuaian Lahan Akhir"]}
+    if os.path.isdir(RELEASES_DIR):
+        for version in sorted(os.listdir(RELEASES_DIR), reverse=True):
+            path = os.path.join(RELEASES_DIR, version, class_file)
+            if os.path.exists(path):
+                releases[version] = path
+    return releases
+
+def file_stamp(path):
+    # (mtime, size) as an extra cache key, so a release file replaced in place
+    # is recomputed instead of served from the cache keyed on its path
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_data(show_spinner=False)
+def compute_class_transitions(path_from, path_to, stamps=None):
+    # Align the later release onto the earlier grid, then count every
+    # (from, to) class pair in one bincount over the paired codes.
+    # stamps only keys the cache (see file_stamp).
+    ref = raster_store.reference_grid(path_from)
+    codes_from = raster_store.align_layer(path_from, ref)
+    codes_to = raster_store.align_layer(path_to, ref)
+    if codes_from.dtype != np.uint8 or codes_to.dtype != np.uint8:
+        raise ValueError("Raster kelas harus berisi kode kelas bulat")
+    
+    gdf = load_boundary(SHP_PATH).to_crs(ref["crs"])
+    inside = ~geometry_mask(list(gdf.geometry), out_shape=(ref["height"], ref["width"]), transform=ref["transform"])
+    
+    n_codes = 5  # 0 = nodata, 1-4 = N/S3/S2/S1
+    codes_from = np.minimum(codes_from, n_codes - 1)
+    codes_to = np.minimum(codes_to, n_codes - 1)
+    paired = codes_from.astype(np.int32) * n_codes + codes_to
+    matrix = np.bincount(paired[inside], minlength=n_codes * n_codes).reshape(n_codes, n_codes)
+    pixel_areas = pixel_areas_m2(ref["transform"], paired.shape, ref["crs"])
+    matrix_ha = np.bincount(paired[inside], weights=pixel_areas[inside], minlength=n_codes * n_codes).reshape(n_codes, n_codes) / 10000
+    
+    # Transition map: 1 = turun kelas, 2 = tetap, 3 = naik kelas (NaN = no data in either release)
+    change = np.sign(codes_to.astype(np.int8) - codes_from.astype(np.int8)) + 2.0
+    change[(codes_from == 0) | (codes_to == 0) | ~inside] = np.nan
+    
+    return matrix, matrix_ha, change, ref["transform"]
+
+@st.cache_data(show_spinner=False)
+def render_transition_overlay(path_from, path_to, stamps=None):
+    _, _, change, transform = compute_class_transitions(path_from, path_to, stamps)
+    return colorize_overlay(change, transform, transition_colors)
+
+def overlay_colors(raster_path):
+    return parameter_colors if raster_path == layer_options["Faktor Pembatas"] else class_colors
+
+@st.cache_resource(show_spinner=False)
+def rendered_overlays():
+    # Layers whose full overlay is already in this process's cache
+    return set()
+
+@st.cache_data(show_spinner=False)
+def render_raster_overlay(raster_path):
+    # PNG base64 + bounds are cached per layer; opacity is applied by the overlay itself
+    rendered_overlays().add(raster_path)
+    gdf = load_boundary(SHP_PATH)
+    data, out_transform = read_clipped_raster(raster_path, gdf)
+    return colorize_overlay(data, out_transform, overlay_colors(raster_path))
+
+def display_grid_pixels(raster_path):
+    store = load_raster_store()
+    if raster_path.startswith(DERIVED_PREFIX) or (store is not None and store.has_native_layer(raster_path)):
+        ref = raster_store.reference_grid()
+        return ref["height"] * ref["width"]
+    with rasterio.open(raster_path) as src:
+        return src.height * src.width
+
+def needs_preview(raster_path):
+    return raster_path not in rendered_overlays() and display_grid_pixels(raster_path) >= PREVIEW_MIN_PIXELS
+
+def read_decimated_raster(raster_path, max_size):
+    # Nearest-neighbour decimation to at most max_size pixels on the longest side,
+    # clipped to the study area. Stack and derived layers are strided before any
+    # float conversion; GeoTIFFs are read with out_shape, which uses the file's
+    # overviews when present instead of decoding every full-resolution block.
+    store = load_raster_store()
+    if raster_path.startswith(DERIVED_PREFIX):
+        codes, transform = read_derived_layer(raster_path)
+        step = max(1, int(np.ceil(max(codes.shape) / max_size)))
+        codes = codes[::step, ::step]
+        data = codes.astype(np.float64)
+        data[(codes == 0) | ~load_boundary_mask()[::step, ::step]] = np.nan
+        return data, transform * rasterio.Affine.scale(step), step
+    if store is not None and store.has_native_layer(raster_path) and store.boundary() is not None:
+        step = max(1, int(np.ceil(max(store.height, store.width) / max_size)))
+        data = store.read_float(raster_path, store.boundary(), step)
+        return data, store.transform * rasterio.Affine.scale(step), step
+    
+    with rasterio.open(raster_path) as src:
+        step = max(1, int(np.ceil(max(src.height, src.width) / max_size)))
+        out_shape = (int(np.ceil(src.height / step)), int(np.ceil(src.width / step)))
+        data = src.read(1, out_shape=out_shape, resampling=Resampling.nearest).astype(np.float64)
+        transform = src.transform * rasterio.Affine.scale(src.width / out_shape[1], src.height / out_shape[0])
+        if src.nodata is not None:
+            data[data == src.nodata] = np.nan
+        gdf = load_boundary(SHP_PATH).to_crs(src.crs)
+        data[geometry_mask(list(gdf.geometry), out_shape=out_shape, transform=transform)] = np.nan
+        return data, transform, step
+
+@st.cache_data(show_spinner=False)
+def render_raster_preview(raster_path):
+    # Low-resolution first paint for the progressive map; None when the raster is already small
+    data, transform, step = read_decimated_raster(raster_path, PREVIEW_MAX_SIZE)
+    if step == 1:
+        return None
+    return colorize_overlay(data, transform, overlay_colors(raster_path))
+
+def colorize_overlay(data, out_transform, colors):
+    # Values 1..len(colors) are drawn with colors[value - 1]; NaN becomes transparent
+    # Calculate bounds for the clipped raster - use finite values only
+    finite_mask = np.isfinite(data)
+    rows, cols = np.where(finite_mask)  # Get indices of finite data
+    
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    
+    min_row, max_row = rows.min(), rows.max()
+    min_col, max_col = cols.min(), cols.max()
+    
+    # Transform bounds to lat/lon
+    top_left = rasterio.transform.xy(out_transform, min_row, min_col)
+    bottom_right = rasterio.transform.xy(out_transform, max_row, max_col)
+    raster_bounds = [[bottom_right[1], top_left[0]], [top_left[1], bottom_right[0]]]
+    
+    # Clip data to valid bounds
+    data = data[min_row:max_row+1, min_col:max_col+1]
+    
+    # Prepare colormap and normalize data
+    vmin, vmax = 1, len(colors)
+    
+    # Create a clean working copy of data
+    data_clean = np.copy(data)
+    
+    # Identify valid data (not NaN, not infinite)
+    valid_mask = np.isfinite(data_clean)
+    
+    # For invalid pixels, set to a default value that won't interfere with coloring
+    data_clean[~valid_mask] = 0
+    
+    # Clip valid data to the expected range
+    data_clean[valid_mask] = np.clip(data_clean[valid_mask], vmin, vmax)
+    
+    # Create colormap
+    cmap = ListedColormap(colors)
+    norm = BoundaryNorm(np.arange(len(colors) + 1) + 0.5, cmap.N)
+    
+    # Apply colormap to the entire array
+    colored_data = plt.cm.ScalarMappable(norm=norm, cmap=cmap).to_rgba(data_clean, bytes=True)
+    
+    # Set alpha channel: 255 for valid pixels, 0 for invalid pixels
+    alpha_channel = np.where(valid_mask, 255, 0).astype(np.uint8)
+    colored_data[:, :, 3] = alpha_channel
+    
+    # Ensure all values are within uint8 range
+    colored_data = np.clip(colored_data, 0, 255).astype(np.uint8)
+    
+    # Create image
+    img = Image.fromarray(colored_data, mode='RGBA')
+    
+    # Save image to base64
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    img_str = base64.b64encode(buffered.getvalue()).decode()
+    img_uri = f"data:image/png;base64,{img_str}"
+    
+    return img_uri, raster_bounds
+
+class VectorTileTooltip(MacroElement):
+    # Sticky hover tooltip (class + polygon area) for a VectorGrid layer
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.tooltip({sticky: true});
+        {{ this.layer.get_name() }}.on('mouseover mousemove', function(e) {
+            var p = e.layer.properties;
+            {{ this.get_name() }}
+                .setLatLng(e.latlng)
+                .setContent('<b>' + p.kelas + '</b><br>Luas poligon: ' + p.luas_ha.toFixed(1) + ' Ha')
+                .addTo({{ this.map.get_name() }});
+        });
+        {{ this.layer.get_name() }}.on('mouseout', function() {
+            {{ this.map.get_name() }}.closeTooltip({{ this.get_name() }});
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer, map_obj):
+        super().__init__()
+        self._name = "VectorTileTooltip"
+        self.layer = layer
+        self.map = map_obj
+
+def add_vector_class_layer(m, vector_source, layer_name, opacity):
+    # Crisp class polygons from the MVT pyramid, colored like the raster overlay
+    options = """{
+        "interactive": true,
+        "maxNativeZoom": %d,
+        "vectorTileLayerStyles": {
+            "kelas": function(p, z) {
+                var colors = %s;
+                var c = colors[Math.min(Math.max(p.kode, 1), colors.length) - 1];
+                return {"fill": true, "fillColor": c, "fillOpacity": %s, "color": c, "weight": 0.5, "opacity": 1};
+            }
+        }
+    }""" % (vector_source["max_zoom"], json.dumps(class_colors), opacity)
+    layer = VectorGridProtobuf(vector_source["url"], layer_name, options)
+    layer.add_to(m)
+    VectorTileTooltip(layer, m).add_to(m)
+
+def create_base_map(basemap=ONLINE_BASEMAP):
+    local_basemap = start_local_basemap() if basemap == LOCAL_BASEMAP else None
+    
     # Initialize map
     m = folium.Map(
         location=[-7.1464, 107.9036],  # Initial center (approximate Kertasari)
         zoom_start=12,
-        tiles='OpenStreetMap'  # Only use OpenStreetMap as basemap
+        tiles='OpenStreetMap' if local_basemap is None else None
     )
     
+    if local_basemap is not None:
+        folium.TileLayer(
+            tiles=local_basemap["url"],
+            attr=local_basemap["attribution"],
+            name="Basemap Lokal",
+            min_zoom=local_basemap["min_zoom"],
+            max_native_zoom=local_basemap["max_zoom"],
+            max_zoom=max(local_basemap["max_zoom"], 18)
+        ).add_to(m)
+    return m
+
+def create_preview_map(overlay_data, layer_name, opacity, basemap=ONLINE_BASEMAP):
+    # Progressive map first paint: basemap and the decimated overlay only. The
+    # boundary GeoJSON and markers come with the full map, so this page stays small.
+    m = create_base_map(basemap)
+    img_uri, raster_bounds = overlay_data
+    m.fit_bounds(raster_bounds)
+    folium.raster_layers.ImageOverlay(
+        image=img_uri,
+        bounds=raster_bounds,
+        opacity=opacity,
+        name=layer_name,
+        zindex=1
+    ).add_to(m)
+    return m
+
+def create_interactive_map(raster_path, layer_name, opacity, overlay_data=None, basemap=ONLINE_BASEMAP, vector_source=None):
+    m = create_base_map(basemap)
+    
     # Load shapefile for clipping and zooming
-    shp_path = "data/Kec_Kertasari.shp"
+    shp_path = SHP_PATH
     try:
-        gdf = gpd.read_file(shp_path)
-        if gdf.crs != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
+        gdf = load_boundary(shp_path)
         
         # Calculate bounds for zooming
         bounds = gdf.total_bounds  # [minx, miny, maxx, maxy]
@@ -630,77 +2251,16 @@ def create_interactive_map(raster_path, layer_name, opacity):
     
     # Process raster with clipping
     try:
-        with rasterio.open(raster_path) as src:
-            # Clip raster to shapefile
-            gdf_utm = gdf.to_crs(src.crs)  # Reproject shapefile to raster CRS
-            shapes = [geom for geom in gdf_utm.geometry]
-            out_image, out_transform = mask(src, shapes, crop=True, nodata=src.nodata)
-            data = out_image[0]  # First band
-            
-            # Handle nodata values properly
-            if src.nodata is not None:
-                data = np.where(data == src.nodata, np.nan, data)
-            
-            # Ensure data is float to handle NaN properly
-            data = data.astype(np.float64)
-            
-            # Calculate bounds for the clipped raster - use finite values only
-            finite_mask = np.isfinite(data)
-            rows, cols = np.where(finite_mask)  # Get indices of finite data
-            
-            if len(rows) == 0 or len(cols) == 0:
+        if vector_source is not None:
+            # Vector tiles replace the PNG overlay, so it is not rendered at all
+            add_vector_class_layer(m, vector_source, layer_name, opacity)
+        else:
+            if overlay_data is None:
+                overlay_data = render_raster_overlay(raster_path)
+            if overlay_data is None:
                 st.error("Raster tidak memiliki data valid setelah clipping.")
                 return m
-            
-            min_row, max_row = rows.min(), rows.max()
-            min_col, max_col = cols.min(), cols.max()
-            
-            # Transform bounds to lat/lon
-            top_left = rasterio.transform.xy(out_transform, min_row, min_col)
-            bottom_right = rasterio.transform.xy(out_transform, max_row, max_col)
-            raster_bounds = [[bottom_right[1], top_left[0]], [top_left[1], bottom_right[0]]]
-            
-            # Clip data to valid bounds
-            data = data[min_row:max_row+1, min_col:max_col+1]
-            
-            # Prepare colormap and normalize data
-            colors = ['#d7191c', '#fdae61', '#a6d96a', '#1a9641']
-            vmin, vmax = 1, 4
-            
-            # Create a clean working copy of data
-            data_clean = np.copy(data)
-            
-            # Identify valid data (not NaN, not infinite)
-            valid_mask = np.isfinite(data_clean)
-            
-            # For invalid pixels, set to a default value that won't interfere with coloring
-            data_clean[~valid_mask] = 0
-            
-            # Clip valid data to the expected range
-            data_clean[valid_mask] = np.clip(data_clean[valid_mask], vmin, vmax)
-            
-            # Create colormap
-            cmap = ListedColormap(colors)
-            norm = BoundaryNorm([0.5, 1.5, 2.5, 3.5, 4.5], cmap.N)
-            
-            # Apply colormap to the entire array
-            colored_data = plt.cm.ScalarMappable(norm=norm, cmap=cmap).to_rgba(data_clean, bytes=True)
-            
-            # Set alpha channel: 255 for valid pixels, 0 for invalid pixels
-            alpha_channel = np.where(valid_mask, 255, 0).astype(np.uint8)
-            colored_data[:, :, 3] = alpha_channel
-            
-            # Ensure all values are within uint8 range
-            colored_data = np.clip(colored_data, 0, 255).astype(np.uint8)
-            
-            # Create image
-            img = Image.fromarray(colored_data, mode='RGBA')
-            
-            # Save image to base64
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            img_uri = f"data:image/png;base64,{img_str}"
+            img_uri, raster_bounds = overlay_data
             
             # Add raster overlay
             overlay = folium.raster_layers.ImageOverlay(
@@ -712,7 +2272,7 @@ def create_interactive_map(raster_path, layer_name, opacity):
                 zindex=1
             )
             overlay.add_to(m)
-            
+        
     except Exception as e:
         st.error(f"Error loading raster: {str(e)}")
         import traceback
@@ -798,10 +2358,19 @@ def create_interactive_map(raster_path, layer_name, opacity):
     
     return m
 
+def format_raster_value(layer_name, value):
+    if pd.isna(value):
+        return "-"
+    return f"{float(value):.2f}" if layer_name == SCORE_LAYER else f"{int(round(float(value)))}"
+
 def interpret_raster_value(layer_name, value):
     if pd.isna(value) or value == 0:
         return "No Data"
     
+    # The continuous score keeps its decimals; every other layer holds class codes
+    if layer_name == SCORE_LAYER:
+        return f"Skor kesesuaian {float(value):.2f}"
+    
     try:
         value = int(round(float(value)))
     except (ValueError, TypeError):
@@ -814,6 +2383,8 @@ def interpret_raster_value(layer_name, value):
             3: "Cukup Sesuai (S2)",
             4: "Sangat Sesuai (S1)"
         }
+    elif layer_name == "Faktor Pembatas":
+        interpretations = limiting_factor_names()
     else:
         interpretations = {
             1: "Kurang Baik",
@@ -826,54 +2397,95 @@ def interpret_raster_value(layer_name, value):
 
 def show_layer_statistics(raster_path, layer_name):
     try:
-        with rasterio.open(raster_path) as src:
-            data = src.read(1)
-            data = data[data != src.nodata]
-            data = data[~np.isnan(data)]
-            pixel_size = src.res[0] * src.res[1]  # Luas per piksel dalam meter persegi
+        unique, counts, areas = raster_value_counts(raster_path)
+        
+        if len(counts) > 0:
+            if layer_name != "Faktor Pembatas":
+                # Gabungkan nilai di luar rentang 1-4 ke kelas terdekat
+                unique, inverse = np.unique(np.clip(unique, 1, 4), return_inverse=True)
+                counts = np.bincount(inverse, weights=counts).astype(np.int64)
+                areas = np.bincount(inverse, weights=areas)
+            total = np.sum(counts)
             
-            if len(data) > 0:
-                data = np.clip(data, 1, 4)
-                unique, counts = np.unique(data, return_counts=True)
-                total = np.sum(counts)
-                
-                st.markdown("### 📊 Statistik Layer")
-                
-                if layer_name == "Kesesuaian Lahan Akhir":
-                    class_map = {
-                        1: "Tidak Sesuai (N)",
-                        2: "Sesuai Marginal (S3)",
-                        3: "Cukup Sesuai (S2)",
-                        4: "Sangat Sesuai (S1)"
-                    }
-                else:
-                    class_map = {
-                        1: "Kurang Baik",
-                        2: "Cukup",
-                        3: "Baik",
-                        4: "Sangat Baik"
-                    }
-                
-                for val in sorted(unique):
-                    if val in class_map:
-                        count = counts[np.where(unique == val)[0][0]]
-                        percentage = (count / total) * 100
-                        interpretation = class_map[val]
-                        area_ha = (count * pixel_size) / 10000  # Konversi m² ke hektar
-                        
-                        st.markdown(f"""
-                        <div class="layer-stats-container">
-                            <strong>{interpretation}</strong><br>
-                            {percentage:.1f}% ({count:,} piksel)<br>
-                            Luas: {area_ha:.1f} Ha
-                        </div>
-                        """, unsafe_allow_html=True)
-                
-                st.markdown(f"**Total Piksel:** {total:,}")
-                st.markdown(f"**Luas Total:** {(total * pixel_size) / 10000:.1f} Ha")
+            st.markdown("### 📊 Statistik Layer")
+            
+            if layer_name == "Kesesuaian Lahan Akhir":
+                class_map = {
+                    1: "Tidak Sesuai (N)",
+                    2: "Sesuai Marginal (S3)",
+                    3: "Cukup Sesuai (S2)",
+                    4: "Sangat Sesuai (S1)"
+                }
+            elif layer_name == "Faktor Pembatas":
+                class_map = limiting_factor_names()
             else:
-                st.warning("Raster kosong atau tidak memiliki data yang bisa dihitung.")
-                
+                class_map = {
+                    1: "Kurang Baik",
+                    2: "Cukup",
+                    3: "Baik",
+                    4: "Sangat Baik"
+                }
+            
+            for val in sorted(unique):
+                if val in class_map:
+                    index = np.where(unique == val)[0][0]
+                    count = counts[index]
+                    percentage = (count / total) * 100
+                    interpretation = class_map[val]
+                    area_ha = areas[index]
+                    
+                    st.markdown(f"""
+                    <div class="layer-stats-container">
+                        <strong>{interpretation}</strong><br>
+                        {percentage:.1f}% ({count:,} piksel)<br>
+                        Luas: {area_ha:.1f} Ha
+                    </div>
+                    """, unsafe_allow_html=True)
+            
+            st.markdown(f"**Total Piksel:** {total:,}")
+            st.markdown(f"**Luas Total:** {np.sum(areas):.1f} Ha")
+        else:
+            st.warning("Raster kosong atau tidak memiliki data yang bisa dihitung.")
+            
+    except Exception as e:
+        st.error(f"Error calculating statistics: {str(e)}")
+
+def show_score_statistics(raster_path, method, n_classes):
+    try:
+        score = load_score_bins(raster_path)
+        df_classes = score_classes(raster_path, method, n_classes)
+        colors = score_colors(len(df_classes))
+        
+        st.markdown("### 📊 Statistik Layer")
+        for color, (_, row) in zip(colors, df_classes.iterrows()):
+            st.markdown(f"""
+            <div class="layer-stats-container" style="border-left: 5px solid {color};">
+                <strong>Skor {row['Rentang Skor']}</strong><br>
+                {row['Persentase']:.1f}% ({row['Piksel']:,} piksel)<br>
+                Luas: {row['Luas (Ha)']:.1f} Ha
+            </div>
+            """, unsafe_allow_html=True)
+        
+        st.markdown(f"**Total Piksel:** {df_classes['Piksel'].sum():,}")
+        st.markdown(f"**Luas Total:** {df_classes['Luas (Ha)'].sum():.1f} Ha")
+        
+        _, bin_class = score_bin_classes(raster_path, method, n_classes)
+        centers = (score["edges"][:-1] + score["edges"][1:]) / 2
+        fig_hist = go.Figure(go.Bar(
+            x=centers,
+            y=score["area_ha"],
+            marker_color=[colors[c - 1] for c in bin_class],
+            marker_line_width=0
+        ))
+        fig_hist.update_layout(
+            title="Histogram Skor",
+            xaxis_title="Skor",
+            yaxis_title="Luas (Ha)",
+            bargap=0,
+            height=280,
+            margin=dict(l=10, r=10, t=40, b=10)
+        )
+        st.plotly_chart(fig_hist, use_container_width=True)
     except Exception as e:
         st.error(f"Error calculating statistics: {str(e)}")
 
@@ -886,7 +2498,7 @@ def analyze_parameter(csv_path, param_name):
             st.error(f"File CSV untuk {param_name} tidak memiliki kolom yang diperlukan: Kelas, Piksel, Persentase, Area_km2, Skor")
             return
         
-        df_param['Luas (Ha)'] = df_param['Area_km2'] * 100
+        df_param = raster_class_table(df_param, layer_options[param_name])
         
         df_param['Interpretasi'] = df_param['Skor'].apply(lambda x: interpret_raster_value(param_name, x))
         
@@ -970,7 +2582,8 @@ def validate_data_files():
                 with rasterio.open(file) as src:
                     pass
             elif file.endswith('.shp'):
-                gpd.read_file(file)
+                # Header only: the boundary itself is read bbox-limited by load_boundary
+                boundary_store.feature_count(boundary_store.resolve(file))
             else:
                 pd.read_csv(file)
         except: